@@ -19,7 +19,9 @@ class Settings(BaseSettings):
     # Allow all origins for development (mobile testing)
     cors_origins: list[str] = ["*"]
 
-    # Rate limiting
+    # Rate limiting (Redis backs the sliding window across workers when set;
+    # empty falls back to a per-process window)
+    redis_url: str = ""
     rate_limit_requests: int = 100
     rate_limit_period: int = 60  # seconds
 
@@ -37,12 +39,19 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
+# mkdir(exist_ok=True) still costs a syscall per path, so gate the directory
+# setup behind a process-wide sentinel rather than repeating it on startup.
+_dirs_ready = False
+
+
 @lru_cache()
 def get_settings() -> Settings:
-    """Get cached settings instance."""
+    """Get cached settings instance, creating cache directories on first use."""
+    global _dirs_ready
     settings = Settings()
-    # Ensure cache directories exist
-    settings.cache_dir.mkdir(parents=True, exist_ok=True)
-    settings.stems_dir.mkdir(parents=True, exist_ok=True)
-    settings.analysis_dir.mkdir(parents=True, exist_ok=True)
+    if not _dirs_ready:
+        settings.cache_dir.mkdir(parents=True, exist_ok=True)
+        settings.stems_dir.mkdir(parents=True, exist_ok=True)
+        settings.analysis_dir.mkdir(parents=True, exist_ok=True)
+        _dirs_ready = True
     return settings
@@ -1,29 +1,81 @@
 """Main FastAPI application for Beatly backend."""
 
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+import httpx
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
+from fastapi.responses import ORJSONResponse
 
 from app.config import get_settings
+from app.middleware import ResponseCacheMiddleware
 from app.routes import auth, playlists, tracks, uploads
+from app.services import analysis as analysis_service
+
+# Prefer an io_uring completion-driven loop when available: it removes the
+# per-chunk readiness syscalls from the stream-proxy hot path (needs Linux
+# >= 5.11). This must happen at import time — under `reload=True` uvicorn
+# serves from a fresh process that only imports this module, so a policy
+# set in the __main__ block would never reach it.
+try:
+    import uringcore
+
+    asyncio.set_event_loop_policy(uringcore.EventLoopPolicy())
+    _LOOP_IMPL = "none"  # policy is already set; don't let uvicorn override it
+except ImportError:
+    _LOOP_IMPL = "uvloop"
 
 settings = get_settings()
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage shared resources for the app's lifetime."""
+    # One SoundCloud client for the whole app: connection pooling avoids a
+    # TCP+TLS handshake per request, and HTTP/2 multiplexes concurrent calls
+    # over one connection instead of serializing on the keepalive pool.
+    app.state.http_client = httpx.AsyncClient(
+        base_url="https://api.soundcloud.com",
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+
+    # CPU-bound librosa analysis runs in separate processes: under the GIL a
+    # single analyze call would stall every other request on this worker.
+    app.state.cpu_pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2))
+
+    # In-flight work map for request coalescing (see tracks routes)
+    app.state.inflight = {}
+
+    # Stem-separation queue + consumer must be created (and torn down) with
+    # the loop: an asyncio.Queue binds to the loop it first runs on, so a
+    # lazily-created one would break after an in-process loop restart.
+    analysis_service.start_stem_worker()
+
+    yield
+
+    await analysis_service.stop_stem_worker()
+    app.state.cpu_pool.shutdown()
+    await analysis_service.aclose_client()
+    await app.state.http_client.aclose()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="Beatly API",
     description="DJ-style mixing backend with SoundCloud integration",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Rate limiting
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Whole-response cache for the hot read-only analysis endpoints
+app.add_middleware(ResponseCacheMiddleware)
 
 # CORS
 app.add_middleware(
@@ -47,21 +99,17 @@ async def health_check():
     return {"status": "healthy", "service": "beatly-api"}
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup."""
-    # Ensure cache directories exist
-    settings.cache_dir.mkdir(parents=True, exist_ok=True)
-    settings.stems_dir.mkdir(parents=True, exist_ok=True)
-    settings.analysis_dir.mkdir(parents=True, exist_ok=True)
-
-
 if __name__ == "__main__":
     import uvicorn
 
+    # Without uringcore, uvloop + httptools still cut per-request event-loop
+    # and HTTP parsing overhead. For production, run under
+    # `gunicorn -k uvicorn.workers.UvicornWorker --workers N` instead.
     uvicorn.run(
         "app.main:app",
         host=settings.api_host,
         port=settings.api_port,
+        loop=_LOOP_IMPL,
+        http="httptools",
         reload=True,
     )
@@ -0,0 +1,88 @@
+"""Response-caching middleware for read-heavy analysis endpoints."""
+
+import re
+from time import monotonic
+
+from cachetools import TTLCache
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+# Freshness policy per path: analyses are immutable once computed so they can
+# stay fresh longer; compatibility results follow the underlying analyses.
+_POLICIES = (
+    (re.compile(r"^/api/tracks/\d+/analysis$"), 60),
+    (re.compile(r"^/api/tracks/compatibility$"), 30),
+)
+
+# Entries survive past freshness so a failing service can serve the last
+# good body instead of an error.
+_HARD_TTL = 600
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """
+    Cache whole GET responses for the endpoints in _POLICIES.
+
+    A fresh hit skips routing, the service layer, and Pydantic/JSON
+    serialization entirely — the stored body bytes go straight out. If the
+    handler raises or returns a 5xx while a stale body is still alive, the
+    stale body is served with `X-Cache: stale`.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._store: TTLCache = TTLCache(maxsize=10_000, ttl=_HARD_TTL)
+
+    @staticmethod
+    def _ttl_for(path: str):
+        for pattern, ttl in _POLICIES:
+            if pattern.match(path):
+                return ttl
+        return None
+
+    def _serve(self, entry, cache_state: str) -> Response:
+        body, status, content_type, _ = entry
+        return Response(
+            body,
+            status_code=status,
+            media_type=content_type,
+            headers={"X-Cache": cache_state},
+        )
+
+    async def dispatch(self, request, call_next):
+        if request.method != "GET":
+            return await call_next(request)
+
+        ttl = self._ttl_for(request.url.path)
+        if ttl is None:
+            return await call_next(request)
+
+        key = f"resp:{request.url.path}:{request.url.query}"
+        entry = self._store.get(key)
+        if entry is not None and monotonic() < entry[3]:
+            return self._serve(entry, "hit")
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            if entry is not None:
+                return self._serve(entry, "stale")
+            raise
+
+        if response.status_code >= 500 and entry is not None:
+            return self._serve(entry, "stale")
+
+        if response.status_code != 200:
+            return response
+
+        # Drain the body so it can be stored and replayed on later hits.
+        # The content type must come from the headers: call_next returns
+        # BaseHTTPMiddleware's wrapper response, whose media_type is None.
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        content_type = response.headers.get("content-type")
+        self._store[key] = (body, response.status_code, content_type, monotonic() + ttl)
+        return Response(
+            body,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+        )
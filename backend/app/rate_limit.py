@@ -0,0 +1,117 @@
+"""Sliding-window rate limiting for Beatly routes.
+
+Uses a Redis sorted-set sliding-window log (atomic via a Lua script) so
+limits hold across multiple workers and replicas, unlike the previous
+per-process fixed-window counters. When no Redis URL is configured the
+limiter falls back to an in-process sliding window, which is correct for
+a single worker (the default dev setup).
+"""
+
+import time
+from collections import deque
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Request
+
+from app.config import get_settings
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:
+    aioredis = None
+    RedisError = None
+
+settings = get_settings()
+
+# Atomically: drop entries older than the window, count the rest, and admit
+# the request only if under the limit. Returns remaining quota or -1.
+_SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now_ms = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now_ms - window_ms)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now_ms, now_ms .. '-' .. count)
+    redis.call('PEXPIRE', key, window_ms)
+    return limit - count - 1
+end
+return -1
+"""
+
+_redis = None
+_limiter_script = None
+
+# In-process fallback: request timestamps (ms) per key. Bounded so an
+# IP-rotating client can't grow the map forever — each check re-inserts
+# the key, refreshing its TTL, so only idle keys expire. The TTL must
+# exceed any configured rate-limit window.
+_local_windows: TTLCache = TTLCache(maxsize=100_000, ttl=600)
+
+
+async def _redis_check(key: str, limit: int, window_ms: int) -> int:
+    """Run the sliding-window script against Redis. Returns remaining or -1."""
+    global _redis, _limiter_script
+    if _redis is None:
+        _redis = aioredis.from_url(settings.redis_url)
+        # register_script re-loads transparently on NOSCRIPT, so a Redis
+        # restart (which flushes the script cache) doesn't break the limiter
+        _limiter_script = _redis.register_script(_SLIDING_WINDOW_LUA)
+    now_ms = int(time.time() * 1000)
+    return int(await _limiter_script(keys=[key], args=[now_ms, window_ms, limit]))
+
+
+def _local_check(key: str, limit: int, window_ms: int) -> int:
+    """In-process sliding window with the same semantics."""
+    now_ms = int(time.time() * 1000)
+    window = _local_windows.get(key)
+    if window is None:
+        window = deque()
+    _local_windows[key] = window  # (re)insert to refresh the entry's TTL
+    cutoff = now_ms - window_ms
+    while window and window[0] <= cutoff:
+        window.popleft()
+    if len(window) < limit:
+        window.append(now_ms)
+        return limit - len(window)
+    return -1
+
+
+def rate_limit(limit: int, window: int = 60):
+    """
+    Build a FastAPI dependency enforcing `limit` requests per `window` seconds.
+
+    Keys by client IP and request path. Raises 429 with rate-limit headers
+    when the window is exhausted.
+    """
+    window_ms = window * 1000
+
+    async def dependency(request: Request) -> None:
+        client_ip = request.client.host if request.client else "unknown"
+        key = f"ratelimit:{client_ip}:{request.url.path}"
+
+        if aioredis is not None and settings.redis_url:
+            try:
+                remaining = await _redis_check(key, limit, window_ms)
+            except RedisError:
+                # Redis outage: a per-process window degrades gracefully
+                # instead of turning every limited endpoint into a 500
+                remaining = _local_check(key, limit, window_ms)
+        else:
+            remaining = _local_check(key, limit, window_ms)
+
+        if remaining < 0:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded: {limit} per {window} seconds",
+                headers={
+                    "X-RateLimit-Limit": str(limit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(int(time.time()) + window),
+                    "Retry-After": str(window),
+                },
+            )
+
+    return dependency
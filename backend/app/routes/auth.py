@@ -1,24 +1,56 @@
 """SoundCloud OAuth authentication routes."""
 
+import asyncio
+from functools import lru_cache
 from typing import Optional
 from urllib.parse import urlencode
 
 import httpx
-from fastapi import APIRouter, HTTPException, Request
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 from app.config import get_settings
+from app.rate_limit import rate_limit
+from app.utils.auth import extract_token, token_key
+from app.utils.backpressure import sc_guard
+from app.utils.cache import SWRCache
+from app.utils.http import ensure_ok
 
 router = APIRouter()
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
 
-# SoundCloud API endpoints
+# SoundCloud API endpoints (token/API calls go through the shared client's
+# base_url; only the browser-facing authorize URL needs to be absolute)
 SOUNDCLOUD_AUTH_URL = "https://api.soundcloud.com/connect"
-SOUNDCLOUD_TOKEN_URL = "https://api.soundcloud.com/oauth2/token"
-SOUNDCLOUD_API_URL = "https://api.soundcloud.com"
+
+# Short-lived cache for /me lookups; user profiles change rarely enough that
+# a 30s freshness window removes the SoundCloud round-trip from most requests,
+# and the stale-while-revalidate window rides out upstream outages.
+_user_cache = SWRCache(maxsize=10_000, ttl=30)
+
+# Refresh-token stampede protection: when several requests race in with the
+# same expired token, only one coroutine should hit SoundCloud; the rest wait
+# on the per-refresh-token lock and reuse the freshly minted access token.
+# The locks live in a TTLCache so one lock per distinct token seen doesn't
+# accumulate forever; racers that already hold a reference keep sharing the
+# same lock object even if it ages out mid-refresh.
+_refresh_locks: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_refresh_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+
+@lru_cache(maxsize=1)
+def _auth_url(client_id: str, redirect_uri: str) -> str:
+    """Build the authorize URL once; the inputs are effectively constants."""
+    params = {
+        "client_id": client_id,
+        "redirect_uri": redirect_uri,
+        "response_type": "code",
+        "scope": "non-expiring",  # Request long-lived token
+    }
+    return f"{SOUNDCLOUD_AUTH_URL}?{urlencode(params)}"
 
 
 class OAuthCallback(BaseModel):
@@ -58,19 +90,11 @@ async def get_auth_url():
             detail="SoundCloud client ID not configured. Please set SOUNDCLOUD_CLIENT_ID.",
         )
 
-    params = {
-        "client_id": settings.soundcloud_client_id,
-        "redirect_uri": settings.soundcloud_redirect_uri,
-        "response_type": "code",
-        "scope": "non-expiring",  # Request long-lived token
-    }
-
-    url = f"{SOUNDCLOUD_AUTH_URL}?{urlencode(params)}"
+    url = _auth_url(settings.soundcloud_client_id, settings.soundcloud_redirect_uri)
     return {"url": url}
 
 
-@router.post("/soundcloud/callback")
-@limiter.limit("10/minute")
+@router.post("/soundcloud/callback", dependencies=[Depends(rate_limit(10))])
 async def oauth_callback(request: Request, body: OAuthCallback):
     """
     Exchange OAuth code for access token.
@@ -83,80 +107,97 @@ async def oauth_callback(request: Request, body: OAuthCallback):
             detail="SoundCloud credentials not configured",
         )
 
-    # Exchange code for token
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                SOUNDCLOUD_TOKEN_URL,
-                data={
-                    "client_id": settings.soundcloud_client_id,
-                    "client_secret": settings.soundcloud_client_secret,
-                    "grant_type": "authorization_code",
-                    "redirect_uri": settings.soundcloud_redirect_uri,
-                    "code": body.code,
-                },
-            )
+    # Exchange code for token; keep the except scope to the awaits so only
+    # transport failures map to 502
+    client = request.app.state.http_client
+    try:
+        response = await sc_guard.request(
+            client,
+            "POST",
+            "/oauth2/token",
+            data={
+                "client_id": settings.soundcloud_client_id,
+                "client_secret": settings.soundcloud_client_secret,
+                "grant_type": "authorization_code",
+                "redirect_uri": settings.soundcloud_redirect_uri,
+                "code": body.code,
+            },
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
 
-            if response.status_code != 200:
-                error_detail = response.json() if response.text else "Unknown error"
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"SoundCloud OAuth failed: {error_detail}",
-                )
+    if response.status_code != 200:
+        error_detail = response.json() if response.text else "Unknown error"
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"SoundCloud OAuth failed: {error_detail}",
+        )
 
-            token_data = response.json()
+    token_data = orjson.loads(response.content)
 
-            # Get user info
-            user_response = await client.get(
-                f"{SOUNDCLOUD_API_URL}/me",
-                headers={"Authorization": f"OAuth {token_data['access_token']}"},
-            )
+    # Get user info
+    try:
+        user_response = await sc_guard.request(
+            client,
+            "GET",
+            "/me",
+            headers={"Authorization": f"OAuth {token_data['access_token']}"},
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
 
-            if user_response.status_code != 200:
-                raise HTTPException(
-                    status_code=user_response.status_code,
-                    detail="Failed to get user info",
-                )
-
-            user_data = user_response.json()
-
-            return {
-                "access_token": token_data["access_token"],
-                "refresh_token": token_data.get("refresh_token"),
-                "user": {
-                    "id": user_data["id"],
-                    "username": user_data["username"],
-                    "avatar_url": user_data.get("avatar_url"),
-                    "permalink_url": user_data.get("permalink_url", ""),
-                },
-            }
+    ensure_ok(user_response, error_detail="Failed to get user info")
 
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to connect to SoundCloud: {str(e)}",
-            )
+    user_data = orjson.loads(user_response.content)
+
+    return {
+        "access_token": token_data["access_token"],
+        "refresh_token": token_data.get("refresh_token"),
+        "user": {
+            "id": user_data["id"],
+            "username": user_data["username"],
+            "avatar_url": user_data.get("avatar_url"),
+            "permalink_url": user_data.get("permalink_url", ""),
+        },
+    }
 
 
-@router.post("/soundcloud/refresh")
-@limiter.limit("5/minute")
+@router.post("/soundcloud/refresh", dependencies=[Depends(rate_limit(5))])
 async def refresh_token(request: Request):
     """
     Refresh the access token using the refresh token.
     """
-    # Get refresh token from request
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization header")
+    # Require a valid Authorization header before touching SoundCloud
+    extract_token(request)
 
     refresh_token = request.headers.get("X-Refresh-Token")
     if not refresh_token:
         raise HTTPException(status_code=400, detail="Missing refresh token")
 
-    async with httpx.AsyncClient() as client:
+    # Double-checked locking: fast path without the lock, re-check under it.
+    refresh_key = token_key(refresh_token)
+    cached = _refresh_cache.get(refresh_key)
+    if cached is not None:
+        return cached
+
+    lock = _refresh_locks.setdefault(refresh_key, asyncio.Lock())
+    async with lock:
+        cached = _refresh_cache.get(refresh_key)
+        if cached is not None:
+            return cached
+
+        client = request.app.state.http_client
         try:
-            response = await client.post(
-                SOUNDCLOUD_TOKEN_URL,
+            response = await sc_guard.request(
+                client,
+                "POST",
+                "/oauth2/token",
                 data={
                     "client_id": settings.soundcloud_client_id,
                     "client_secret": settings.soundcloud_client_secret,
@@ -164,61 +205,66 @@ async def refresh_token(request: Request):
                     "refresh_token": refresh_token,
                 },
             )
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to refresh token",
-                )
-
-            token_data = response.json()
-            return {"access_token": token_data["access_token"]}
-
         except httpx.RequestError as e:
             raise HTTPException(
                 status_code=502,
                 detail=f"Failed to connect to SoundCloud: {str(e)}",
             )
 
+        ensure_ok(response, error_detail="Failed to refresh token")
 
-@router.get("/soundcloud/me")
-@limiter.limit("30/minute")
-async def get_current_user(request: Request):
-    """
-    Get current authenticated user info.
-    """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization header")
+        token_data = orjson.loads(response.content)
+        result = {"access_token": token_data["access_token"]}
+        _refresh_cache[refresh_key] = result
+        return result
 
-    token = auth_header.replace("Bearer ", "")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{SOUNDCLOUD_API_URL}/me",
-                headers={"Authorization": f"OAuth {token}"},
-            )
+async def _fetch_user(client: httpx.AsyncClient, token: str) -> dict:
+    """Fetch the authenticated user's profile from SoundCloud."""
+    response = await sc_guard.request(
+        client,
+        "GET",
+        "/me",
+        headers={"Authorization": f"OAuth {token}"},
+    )
 
-            if response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
+    ensure_ok(response, error_detail="Failed to get user info")
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to get user info",
-                )
+    user_data = orjson.loads(response.content)
+    return {
+        "id": user_data["id"],
+        "username": user_data["username"],
+        "avatar_url": user_data.get("avatar_url"),
+        "permalink_url": user_data.get("permalink_url", ""),
+    }
 
-            user_data = response.json()
-            return {
-                "id": user_data["id"],
-                "username": user_data["username"],
-                "avatar_url": user_data.get("avatar_url"),
-                "permalink_url": user_data.get("permalink_url", ""),
-            }
 
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to connect to SoundCloud: {str(e)}",
-            )
+@router.get("/soundcloud/me", dependencies=[Depends(rate_limit(30))])
+async def get_current_user(request: Request):
+    """
+    Get current authenticated user info.
+
+    Stale cached profiles are served with `X-Cache: stale` while a
+    background refresh runs.
+    """
+    token = extract_token(request)
+    client = request.app.state.http_client
+
+    cache_key = token_key(token)
+    cached, stale = _user_cache.get(cache_key)
+    if cached is not None:
+        if stale:
+            _user_cache.refresh(cache_key, lambda: _fetch_user(client, token))
+            return ORJSONResponse(cached, headers={"X-Cache": "stale"})
+        return cached
+
+    try:
+        user = await _fetch_user(client, token)
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
+
+    _user_cache.put(cache_key, user)
+    return user
@@ -1,20 +1,24 @@
 """Playlist routes for fetching user playlists from SoundCloud."""
 
+import asyncio
 from typing import List, Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException, Request
+import numpy as np
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 from app.config import get_settings
+from app.rate_limit import rate_limit
+from app.utils.auth import extract_token, token_key
+from app.utils.backpressure import sc_guard
+from app.utils.cache import SWRCache
+from app.utils.http import ensure_ok
 
 router = APIRouter()
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
-
-SOUNDCLOUD_API_URL = "https://api.soundcloud.com"
 
 
 class UserInfo(BaseModel):
@@ -49,137 +53,213 @@ class PlaylistInfo(BaseModel):
     tracks: Optional[List[TrackInfo]] = None
 
 
-def extract_token(request: Request) -> str:
-    """Extract OAuth token from request headers."""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    return auth_header.replace("Bearer ", "")
+# Playlists change on the order of minutes; short freshness TTLs shave the
+# SoundCloud round-trip off repeat calls, while the stale-while-revalidate
+# window keeps serving the last good response during upstream outages.
+_playlists_cache = SWRCache(maxsize=5_000, ttl=20)
+_tracks_cache = SWRCache(maxsize=5_000, ttl=60)
+
+
+async def _fetch_playlists(client: httpx.AsyncClient, token: str) -> list[dict]:
+    """Fetch and reshape the user's playlists from SoundCloud."""
+    response = await sc_guard.request(
+        client,
+        "GET",
+        "/me/playlists",
+        headers={"Authorization": f"OAuth {token}"},
+        params={"limit": 50},
+    )
+
+    ensure_ok(response, error_detail="Failed to fetch playlists")
+
+    playlists_data = orjson.loads(response.content)
+    playlists = []
+
+    for playlist in playlists_data:
+        playlists.append(
+            {
+                "id": playlist["id"],
+                "title": playlist["title"],
+                "user": {
+                    "id": playlist["user"]["id"],
+                    "username": playlist["user"]["username"],
+                    "avatar_url": playlist["user"].get("avatar_url"),
+                    "permalink_url": playlist["user"].get("permalink_url", ""),
+                },
+                "artwork_url": playlist.get("artwork_url"),
+                "track_count": playlist.get("track_count", 0),
+            }
+        )
+
+    return playlists
 
 
-@router.get("")
-@limiter.limit("30/minute")
-async def get_playlists(request: Request) -> List[PlaylistInfo]:
+@router.get("", dependencies=[Depends(rate_limit(30))])
+async def get_playlists(request: Request):
     """
     Get all playlists for the authenticated user.
 
-    Returns a list of playlists with basic info (no tracks included).
+    Returns a list of playlists with basic info (no tracks included),
+    shaped like PlaylistInfo. Built as plain dicts: the data just came out
+    of SoundCloud JSON, so re-validating it through Pydantic on the way
+    out is wasted CPU per playlist. Stale cached responses are served
+    immediately (with `X-Cache: stale`) while a background task refreshes.
     """
     token = extract_token(request)
+    client = request.app.state.http_client
+
+    cache_key = token_key(token)
+    cached, stale = _playlists_cache.get(cache_key)
+    if cached is not None:
+        if stale:
+            _playlists_cache.refresh(cache_key, lambda: _fetch_playlists(client, token))
+            return ORJSONResponse(cached, headers={"X-Cache": "stale"})
+        return cached
+
+    try:
+        playlists = await _fetch_playlists(client, token)
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
+
+    _playlists_cache.put(cache_key, playlists)
+    return playlists
+
+
+async def _fetch_playlist_tracks(
+    client: httpx.AsyncClient, token: str, playlist_id: int
+) -> list[dict]:
+    """Fetch a playlist from SoundCloud and reshape its streamable tracks."""
+    response = await sc_guard.request(
+        client,
+        "GET",
+        f"/playlists/{playlist_id}",
+        headers={"Authorization": f"OAuth {token}"},
+    )
+
+    ensure_ok(
+        response,
+        error_detail="Failed to fetch playlist tracks",
+        not_found_detail="Playlist not found",
+    )
+
+    playlist_data = orjson.loads(response.content)
+    tracks_data = playlist_data.get("tracks", [])
+
+    # Single comprehension keeps the per-track work at dict lookups only;
+    # `for user in (track["user"],)` binds the nested dict once per track
+    # instead of re-indexing it for every field.
+    return [
+        {
+            "id": track["id"],
+            "title": track["title"],
+            "user": {
+                "id": user["id"],
+                "username": user["username"],
+                "avatar_url": user.get("avatar_url"),
+                "permalink_url": user.get("permalink_url", ""),
+            },
+            "artwork_url": track.get("artwork_url"),
+            "duration": track.get("duration", 0),
+            "waveform_url": track.get("waveform_url", ""),
+            "permalink_url": track.get("permalink_url", ""),
+        }
+        for track in tracks_data
+        if track.get("streamable", True)  # Skip tracks that aren't streamable
+        for user in (track["user"],)
+    ]
 
-    async with httpx.AsyncClient() as client:
-        try:
-            # Get user's playlists
-            response = await client.get(
-                f"{SOUNDCLOUD_API_URL}/me/playlists",
-                headers={"Authorization": f"OAuth {token}"},
-                params={"limit": 50},
-            )
 
-            if response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to fetch playlists",
-                )
-
-            playlists_data = response.json()
-            playlists = []
-
-            for playlist in playlists_data:
-                playlists.append(
-                    PlaylistInfo(
-                        id=playlist["id"],
-                        title=playlist["title"],
-                        user=UserInfo(
-                            id=playlist["user"]["id"],
-                            username=playlist["user"]["username"],
-                            avatar_url=playlist["user"].get("avatar_url"),
-                            permalink_url=playlist["user"].get("permalink_url", ""),
-                        ),
-                        artwork_url=playlist.get("artwork_url"),
-                        track_count=playlist.get("track_count", 0),
-                    )
-                )
-
-            return playlists
-
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to connect to SoundCloud: {str(e)}",
+@router.get("/{playlist_id}/tracks", dependencies=[Depends(rate_limit(30))])
+async def get_playlist_tracks(request: Request, playlist_id: int):
+    """
+    Get all tracks in a specific playlist.
+
+    Returns full track information including artwork and duration, shaped
+    like TrackInfo (plain dicts, see get_playlists). Stale cached
+    responses are served with `X-Cache: stale` while a refresh runs.
+    """
+    token = extract_token(request)
+    client = request.app.state.http_client
+
+    cache_key = (token_key(token), playlist_id)
+    cached, stale = _tracks_cache.get(cache_key)
+    if cached is not None:
+        if stale:
+            _tracks_cache.refresh(
+                cache_key, lambda: _fetch_playlist_tracks(client, token, playlist_id)
             )
+            return ORJSONResponse(cached, headers={"X-Cache": "stale"})
+        return cached
+
+    try:
+        tracks = await _fetch_playlist_tracks(client, token, playlist_id)
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
+
+    _tracks_cache.put(cache_key, tracks)
+    return tracks
 
 
-@router.get("/{playlist_id}/tracks")
-@limiter.limit("30/minute")
-async def get_playlist_tracks(request: Request, playlist_id: int) -> List[TrackInfo]:
+@router.get("/{playlist_id}/tracks/raw", dependencies=[Depends(rate_limit(30))])
+async def get_playlist_tracks_raw(request: Request, playlist_id: int):
     """
-    Get all tracks in a specific playlist.
+    Proxy the raw playlist JSON from SoundCloud without re-encoding.
 
-    Returns full track information including artwork and duration.
+    For large playlists the filtered /tracks route parses, rebuilds, and
+    re-serializes hundreds of track dicts. Clients that do their own
+    filtering can use this pass-through instead: bytes stream straight
+    from SoundCloud to the client without touching a JSON parser.
     """
     token = extract_token(request)
+    client = request.app.state.http_client
+
+    req = client.build_request(
+        "GET",
+        f"/playlists/{playlist_id}",
+        headers={"Authorization": f"OAuth {token}"},
+    )
+    try:
+        resp = await client.send(req, stream=True)
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
+
+    if resp.status_code != 200:
+        await resp.aclose()
+        if resp.status_code == 401:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        if resp.status_code == 404:
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        raise HTTPException(
+            status_code=resp.status_code,
+            detail="Failed to fetch playlist tracks",
+        )
 
-    async with httpx.AsyncClient() as client:
+    async def passthrough():
         try:
-            # Get playlist with tracks
-            response = await client.get(
-                f"{SOUNDCLOUD_API_URL}/playlists/{playlist_id}",
-                headers={"Authorization": f"OAuth {token}"},
-            )
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            await resp.aclose()
 
-            if response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Playlist not found")
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to fetch playlist tracks",
-                )
-
-            playlist_data = response.json()
-            tracks_data = playlist_data.get("tracks", [])
-            tracks = []
-
-            for track in tracks_data:
-                # Skip tracks that aren't streamable
-                if not track.get("streamable", True):
-                    continue
-
-                tracks.append(
-                    TrackInfo(
-                        id=track["id"],
-                        title=track["title"],
-                        user=UserInfo(
-                            id=track["user"]["id"],
-                            username=track["user"]["username"],
-                            avatar_url=track["user"].get("avatar_url"),
-                            permalink_url=track["user"].get("permalink_url", ""),
-                        ),
-                        artwork_url=track.get("artwork_url"),
-                        duration=track.get("duration", 0),
-                        waveform_url=track.get("waveform_url", ""),
-                        permalink_url=track.get("permalink_url", ""),
-                    )
-                )
-
-            return tracks
-
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to connect to SoundCloud: {str(e)}",
-            )
+    # Forward encoding headers so the client can decode the raw bytes
+    headers = {
+        name: resp.headers[name]
+        for name in ("content-length", "content-encoding")
+        if name in resp.headers
+    }
+    return StreamingResponse(passthrough(), media_type="application/json", headers=headers)
 
 
-@router.get("/{playlist_id}/smart-order")
-@limiter.limit("10/minute")
+@router.get("/{playlist_id}/smart-order", dependencies=[Depends(rate_limit(10))])
 async def get_smart_order(request: Request, playlist_id: int):
     """
     Get smart ordering for playlist tracks based on compatibility scoring.
@@ -187,32 +267,44 @@ async def get_smart_order(request: Request, playlist_id: int):
     This endpoint calculates the optimal playback order by analyzing
     BPM, key, and energy compatibility between adjacent tracks.
     """
-    from app.services.analysis import calculate_compatibility_score, get_cached_analysis
+    from app.services.analysis import compat_features, get_cached_analysis, pairwise_compat
 
     token = extract_token(request)
 
     # First get all tracks
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{SOUNDCLOUD_API_URL}/playlists/{playlist_id}",
+    client = request.app.state.http_client
+    try:
+        response = await sc_guard.request(
+            client,
+            "GET",
+            f"/playlists/{playlist_id}",
             headers={"Authorization": f"OAuth {token}"},
         )
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to connect to SoundCloud: {str(e)}",
+        )
 
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="Failed to fetch playlist",
-            )
-
-        playlist_data = response.json()
-        tracks = playlist_data.get("tracks", [])
-
-    # Get analyses for all tracks (if available)
-    track_analyses = []
-    for track in tracks:
-        analysis = get_cached_analysis(track["id"])
-        if analysis:
-            track_analyses.append({"track_id": track["id"], "analysis": analysis})
+    ensure_ok(
+        response,
+        error_detail="Failed to fetch playlist",
+        not_found_detail="Playlist not found",
+    )
+
+    playlist_data = orjson.loads(response.content)
+    tracks = playlist_data.get("tracks", [])
+
+    # Get analyses for all tracks (if available). The cache lookups hit disk,
+    # so fan them out to threads instead of reading serially on the loop.
+    analyses = await asyncio.gather(
+        *(asyncio.to_thread(get_cached_analysis, track["id"]) for track in tracks)
+    )
+    track_analyses = [
+        {"track_id": track["id"], "analysis": analysis}
+        for track, analysis in zip(tracks, analyses)
+        if analysis
+    ]
 
     if len(track_analyses) < 2:
         # Not enough analyzed tracks, return original order
@@ -222,30 +314,27 @@ async def get_smart_order(request: Request, playlist_id: int):
             "message": "Not enough tracks analyzed for smart ordering",
         }
 
-    # Greedy algorithm: start with first track, pick best next each time
-    order = []
+    # Greedy algorithm: start with first track, pick best next each time.
+    # All pairwise scores are precomputed in one vectorized pass, so the
+    # greedy walk is just a masked argmax per step instead of N^2 Python
+    # scoring calls.
+    track_ids = [t["track_id"] for t in track_analyses]
+    matrix = pairwise_compat(compat_features([t["analysis"] for t in track_analyses]))
+
+    n = len(track_ids)
+    remaining = np.ones(n, dtype=bool)
+    current = 0
+    remaining[current] = False
+    order = [track_ids[current]]
     scores = {}
-    remaining = track_analyses.copy()
-
-    # Start with the first analyzed track
-    current = remaining.pop(0)
-    order.append(current["track_id"])
 
-    while remaining:
-        best_score = -1
-        best_index = 0
-
-        for i, candidate in enumerate(remaining):
-            score = calculate_compatibility_score(
-                current["analysis"], candidate["analysis"]
-            )
-            if score > best_score:
-                best_score = score
-                best_index = i
-
-        next_track = remaining.pop(best_index)
-        scores[f"{current['track_id']}->{next_track['track_id']}"] = best_score
-        order.append(next_track["track_id"])
-        current = next_track
+    for _ in range(n - 1):
+        next_index = int(np.where(remaining, matrix[current], -1).argmax())
+        scores[f"{track_ids[current]}->{track_ids[next_index]}"] = int(
+            matrix[current, next_index]
+        )
+        order.append(track_ids[next_index])
+        remaining[next_index] = False
+        current = next_index
 
     return {"order": order, "scores": scores}
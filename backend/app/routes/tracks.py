@@ -1,23 +1,22 @@
 """Track routes for streaming, analysis, and stem separation."""
 
+import asyncio
 import hashlib
-import json
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 import httpx
-from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 from app.config import get_settings
+from app.rate_limit import rate_limit
+from app.utils.auth import BEARER_PREFIX, extract_token
 from app.services import analysis as analysis_service
 
 router = APIRouter()
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
 
 SOUNDCLOUD_API_URL = "https://api.soundcloud.com"
 
@@ -75,14 +74,13 @@ def get_token_from_query_or_header(request: Request, token: Optional[str] = None
         return token
 
     auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        return auth_header.replace("Bearer ", "")
+    if auth_header and auth_header.startswith(BEARER_PREFIX):
+        return auth_header[len(BEARER_PREFIX):]
 
     raise HTTPException(status_code=401, detail="Missing authorization")
 
 
-@router.get("/{track_id}/stream")
-@limiter.limit("60/minute")
+@router.get("/{track_id}/stream", dependencies=[Depends(rate_limit(60))])
 async def stream_track(
     request: Request,
     track_id: int,
@@ -96,115 +94,135 @@ async def stream_track(
     """
     access_token = get_token_from_query_or_header(request, token)
 
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        try:
-            # Get track info to find stream URL
-            track_response = await client.get(
-                f"{SOUNDCLOUD_API_URL}/tracks/{track_id}",
-                headers={"Authorization": f"OAuth {access_token}"},
-            )
+    # Shared pooled client: no per-request TLS handshake, and HTTP/2
+    # multiplexes the probes and the audio GET over one connection.
+    client = request.app.state.http_client
+    try:
+        # Probe track info and the /streams fallback concurrently: the two
+        # round-trips to SoundCloud dominate time-to-first-byte, and the
+        # fallback is needed often enough that fetching it serially on
+        # failure doubled TTFB on that path.
+        auth_headers = {"Authorization": f"OAuth {access_token}"}
+        track_response, streams_response = await asyncio.gather(
+            client.get(f"{SOUNDCLOUD_API_URL}/tracks/{track_id}", headers=auth_headers),
+            client.get(
+                f"{SOUNDCLOUD_API_URL}/tracks/{track_id}/streams", headers=auth_headers
+            ),
+            return_exceptions=True,
+        )
+        if isinstance(track_response, BaseException):
+            raise track_response
 
-            if track_response.status_code == 401:
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
+        if track_response.status_code == 401:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-            if track_response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Track not found")
+        if track_response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Track not found")
 
-            if track_response.status_code != 200:
-                raise HTTPException(
-                    status_code=track_response.status_code,
-                    detail="Failed to get track info",
-                )
+        if track_response.status_code != 200:
+            raise HTTPException(
+                status_code=track_response.status_code,
+                detail="Failed to get track info",
+            )
 
-            track_data = track_response.json()
+        track_data = track_response.json()
 
-            # Check if track is streamable
-            if not track_data.get("streamable", False):
-                raise HTTPException(
-                    status_code=403,
-                    detail="This track is not available for streaming",
-                )
-
-            # Get the stream URL
-            # SoundCloud v2 API uses different stream endpoint
-            stream_url = track_data.get("stream_url")
-            if not stream_url:
-                # Try alternative method
-                stream_url = f"{SOUNDCLOUD_API_URL}/tracks/{track_id}/stream"
+        # Check if track is streamable
+        if not track_data.get("streamable", False):
+            raise HTTPException(
+                status_code=403,
+                detail="This track is not available for streaming",
+            )
 
-            # Stream the audio
-            stream_response = await client.get(
+        # Get the stream URL
+        # SoundCloud v2 API uses different stream endpoint
+        stream_url = track_data.get("stream_url")
+        if not stream_url:
+            # Try alternative method
+            stream_url = f"{SOUNDCLOUD_API_URL}/tracks/{track_id}/stream"
+
+        # Open the audio stream without reading the body
+        stream_response = await client.send(
+            client.build_request(
+                "GET",
                 stream_url,
                 headers={"Authorization": f"OAuth {access_token}"},
                 params={"client_id": settings.soundcloud_client_id},
-            )
+            ),
+            stream=True,
+        )
 
-            if stream_response.status_code != 200:
-                # Try with /streams endpoint
-                streams_response = await client.get(
-                    f"{SOUNDCLOUD_API_URL}/tracks/{track_id}/streams",
-                    headers={"Authorization": f"OAuth {access_token}"},
+        if stream_response.status_code != 200:
+            await stream_response.aclose()
+            # Fall back to the /streams probe fetched above
+            if (
+                not isinstance(streams_response, BaseException)
+                and streams_response.status_code == 200
+            ):
+                streams_data = streams_response.json()
+                # Prefer http_mp3_128_url or progressive stream
+                stream_url = streams_data.get(
+                    "http_mp3_128_url",
+                    streams_data.get("progressive_url", ""),
                 )
 
-                if streams_response.status_code == 200:
-                    streams_data = streams_response.json()
-                    # Prefer http_mp3_128_url or progressive stream
-                    stream_url = streams_data.get(
-                        "http_mp3_128_url",
-                        streams_data.get("progressive_url", ""),
+                if stream_url:
+                    stream_response = await client.send(
+                        client.build_request("GET", stream_url), stream=True
                     )
 
-                    if stream_url:
-                        stream_response = await client.get(stream_url)
+        if stream_response.status_code != 200:
+            await stream_response.aclose()
+            raise HTTPException(
+                status_code=stream_response.status_code,
+                detail="Failed to stream audio",
+            )
 
-            if stream_response.status_code != 200:
-                raise HTTPException(
-                    status_code=stream_response.status_code,
-                    detail="Failed to stream audio",
-                )
+    except httpx.RequestError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to stream from SoundCloud: {str(e)}",
+        )
 
-            # Return streaming response
-            async def audio_stream():
-                async for chunk in stream_response.aiter_bytes():
-                    yield chunk
-
-            return StreamingResponse(
-                audio_stream(),
-                media_type="audio/mpeg",
-                headers={
-                    "Accept-Ranges": "bytes",
-                    "Content-Disposition": f'inline; filename="track_{track_id}.mp3"',
-                },
-            )
+    # Return streaming response. aiter_raw with 1 MiB chunks skips
+    # content-decoding and Python-level chunk reassembly, cutting
+    # interpreter round-trips per streamed MB by orders of magnitude
+    # versus the default small-chunk aiter_bytes loop.
+    async def audio_stream():
+        try:
+            async for chunk in stream_response.aiter_raw(chunk_size=1 << 20):
+                yield chunk
+        finally:
+            await stream_response.aclose()
 
-        except httpx.RequestError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Failed to stream from SoundCloud: {str(e)}",
-            )
+    return StreamingResponse(
+        audio_stream(),
+        media_type="audio/mpeg",
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f'inline; filename="track_{track_id}.mp3"',
+        },
+    )
 
 
-@router.post("/{track_id}/analyze")
-@limiter.limit("20/minute")
-async def analyze_track(request: Request, track_id: int) -> TrackAnalysis:
+def _coalesce(app, key: tuple, factory):
     """
-    Analyze a track for BPM, key, energy, and beat grid.
+    Return the in-flight task for `key`, starting it via `factory` if absent.
 
-    This endpoint downloads the track audio (if not cached) and performs
-    ML-based analysis using librosa. Results are cached to disk.
+    Concurrent requests for the same uncached track would each download the
+    audio and burn a core on analysis; coalescing makes the first request do
+    the work while the rest await the same task.
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization")
+    task = app.state.inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        app.state.inflight[key] = task
+        task.add_done_callback(lambda _t, key=key: app.state.inflight.pop(key, None))
+    return task
 
-    token = auth_header.replace("Bearer ", "")
 
-    # Check cache first
-    cached = analysis_service.get_cached_analysis(track_id)
-    if cached:
-        return TrackAnalysis(**cached)
-
-    # Download audio for analysis
+async def _run_analysis(app, track_id: int, token: str) -> dict:
+    """Download, analyze, and cache a track."""
     audio_path = await analysis_service.download_audio_for_analysis(track_id, token)
 
     if not audio_path:
@@ -214,42 +232,81 @@ async def analyze_track(request: Request, track_id: int) -> TrackAnalysis:
         )
 
     try:
-        # Perform analysis
-        result = analysis_service.analyze_audio(track_id, audio_path)
-
-        # Cache result
-        analysis_service.cache_analysis(track_id, result)
-
-        return TrackAnalysis(**result)
-
+        # Perform analysis in the process pool so the event loop stays free
+        result = await analysis_service.analyze_audio_async(
+            track_id, audio_path, executor=app.state.cpu_pool
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Analysis failed: {str(e)}",
         )
 
+    # Cache result
+    await analysis_service.cache_analysis_async(track_id, result)
+    return result
+
 
-@router.get("/{track_id}/analysis")
-@limiter.limit("60/minute")
-async def get_analysis(request: Request, track_id: int) -> TrackAnalysis:
+@router.post("/{track_id}/analyze", dependencies=[Depends(rate_limit(20))])
+async def analyze_track(request: Request, track_id: int) -> dict:
     """
-    Get cached analysis for a track.
+    Analyze a track for BPM, key, energy, and beat grid.
+
+    This endpoint downloads the track audio (if not cached) and performs
+    ML-based analysis using librosa. Results are cached to disk. Concurrent
+    requests for the same track share one analysis run. Responses are
+    plain dicts shaped like TrackAnalysis: the data is produced (and
+    cached) by our own service, so re-validating it per request is
+    wasted CPU.
+    """
+    token = extract_token(request)
+
+    # Check cache first
+    cached = await analysis_service.get_cached_analysis_async(track_id)
+    if cached:
+        return cached
+
+    task = _coalesce(
+        request.app,
+        ("analyze", track_id),
+        lambda: _run_analysis(request.app, track_id, token),
+    )
+    # shield: a waiter disconnecting must not cancel the shared analysis
+    return await asyncio.shield(task)
+
+
+@router.get("/{track_id}/analysis", dependencies=[Depends(rate_limit(60))])
+async def get_analysis(request: Request, track_id: int) -> dict:
+    """
+    Get cached analysis for a track (shaped like TrackAnalysis).
 
     Returns 404 if analysis hasn't been performed yet.
     """
-    cached = analysis_service.get_cached_analysis(track_id)
+    cached = await analysis_service.get_cached_analysis_async(track_id)
     if not cached:
         raise HTTPException(
             status_code=404,
             detail="Analysis not found. Call POST /tracks/{id}/analyze first.",
         )
 
-    return TrackAnalysis(**cached)
+    return cached
 
 
-@router.post("/{track_id}/stems")
-@limiter.limit("5/minute")
-async def request_stems(request: Request, track_id: int) -> StemStatus:
+async def _run_stem_separation(track_id: int, token: str) -> dict:
+    """Download audio if needed and run stem separation."""
+    audio_path = await analysis_service.download_audio_for_analysis(track_id, token)
+
+    if not audio_path:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to download audio for stem separation",
+        )
+
+    return await analysis_service.separate_stems(track_id, audio_path)
+
+
+@router.post("/{track_id}/stems", dependencies=[Depends(rate_limit(5))])
+async def request_stems(request: Request, track_id: int) -> dict:
     """
     Request stem separation for a track.
 
@@ -257,67 +314,58 @@ async def request_stems(request: Request, track_id: int) -> StemStatus:
     runs asynchronously and results are cached to disk.
 
     Note: Stem separation is CPU-intensive and may take several minutes.
+    Responses are StemStatus-shaped dicts straight from the service layer.
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization")
-
-    token = auth_header.replace("Bearer ", "")
+    token = extract_token(request)
 
     # Check if stems already exist
     existing = analysis_service.get_stem_status(track_id)
     if existing and existing["status"] == "ready":
-        return StemStatus(**existing)
+        return existing
 
     # Check if already processing
     if existing and existing["status"] == "processing":
-        return StemStatus(**existing)
+        return existing
 
-    # Download audio if needed
-    audio_path = await analysis_service.download_audio_for_analysis(track_id, token)
-
-    if not audio_path:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to download audio for stem separation",
-        )
-
-    # Start stem separation (this is blocking for MVP, ideally use background task)
+    task = _coalesce(
+        request.app,
+        ("stems", track_id),
+        lambda: _run_stem_separation(track_id, token),
+    )
     try:
-        result = await analysis_service.separate_stems(track_id, audio_path)
-        return StemStatus(**result)
+        return await asyncio.shield(task)
+    except HTTPException:
+        raise
     except Exception as e:
-        return StemStatus(
-            trackId=track_id,
-            status="error",
-            error=str(e),
-        )
+        return {
+            "trackId": track_id,
+            "status": "error",
+            "error": str(e),
+        }
 
 
-@router.get("/{track_id}/stems/status")
-@limiter.limit("60/minute")
-async def get_stem_status(request: Request, track_id: int) -> StemStatus:
-    """Get the status of stem separation for a track."""
+@router.get("/{track_id}/stems/status", dependencies=[Depends(rate_limit(60))])
+async def get_stem_status(request: Request, track_id: int) -> dict:
+    """Get the status of stem separation for a track (StemStatus-shaped)."""
     status = analysis_service.get_stem_status(track_id)
     if not status:
-        return StemStatus(trackId=track_id, status="pending")
-    return StemStatus(**status)
+        return {"trackId": track_id, "status": "pending"}
+    return status
 
 
-@router.get("/{track_id}/stems/{stem_name}")
-@limiter.limit("60/minute")
-async def get_stem(request: Request, track_id: int, stem_name: str):
+@router.get("/{track_id}/stems/{stem_name}", dependencies=[Depends(rate_limit(60))])
+async def get_stem(
+    request: Request,
+    track_id: int,
+    stem_name: Literal["drums", "bass", "vocals", "other", "guitar", "piano"],
+):
     """
     Stream a specific stem (drums, bass, vocals, other).
 
+    Invalid stem names are rejected during route matching by the Literal
+    path param (pydantic-core's C path), so the handler needs no check.
     Returns 404 if stems haven't been separated yet.
     """
-    if stem_name not in ["drums", "bass", "vocals", "other"]:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid stem name. Use: drums, bass, vocals, other",
-        )
-
     stem_path = settings.stems_dir / str(track_id) / f"{stem_name}.wav"
 
     if not stem_path.exists():
@@ -326,13 +374,9 @@ async def get_stem(request: Request, track_id: int, stem_name: str):
             detail="Stem not found. Request stem separation first.",
         )
 
-    def iter_file():
-        with open(stem_path, "rb") as f:
-            while chunk := f.read(65536):
-                yield chunk
-
-    return StreamingResponse(
-        iter_file(),
+    # FileResponse serves via kernel sendfile — no Python per-chunk loop
+    return FileResponse(
+        path=stem_path,
         media_type="audio/wav",
         headers={
             "Content-Disposition": f'inline; filename="{stem_name}_{track_id}.wav"',
@@ -340,20 +384,22 @@ async def get_stem(request: Request, track_id: int, stem_name: str):
     )
 
 
-@router.get("/compatibility")
-@limiter.limit("60/minute")
+@router.get("/compatibility", dependencies=[Depends(rate_limit(60))])
 async def get_compatibility(
     request: Request,
     track_a: int = Query(..., description="First track ID"),
     track_b: int = Query(..., description="Second track ID"),
-) -> CompatibilityResult:
+) -> dict:
     """
-    Calculate mix compatibility between two tracks.
+    Calculate mix compatibility between two tracks (CompatibilityResult-
+    shaped dict).
 
     Both tracks must have been analyzed first.
     """
-    analysis_a = analysis_service.get_cached_analysis(track_a)
-    analysis_b = analysis_service.get_cached_analysis(track_b)
+    analysis_a, analysis_b = await asyncio.gather(
+        analysis_service.get_cached_analysis_async(track_a),
+        analysis_service.get_cached_analysis_async(track_b),
+    )
 
     if not analysis_a:
         raise HTTPException(
@@ -367,5 +413,4 @@ async def get_compatibility(
             detail=f"Track {track_b} has not been analyzed",
         )
 
-    result = analysis_service.calculate_mix_compatibility(analysis_a, analysis_b)
-    return CompatibilityResult(**result)
+    return analysis_service.calculate_mix_compatibility(analysis_a, analysis_b)
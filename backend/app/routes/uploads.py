@@ -1,27 +1,37 @@
 """File upload routes for local MP3 files."""
 
+import asyncio
 import hashlib
+import os
 import shutil
 from pathlib import Path
-from typing import List
+from typing import List, Literal
 import uuid
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 from app.config import get_settings
+from app.rate_limit import rate_limit
+from app.services.track_store import track_store
 
 router = APIRouter()
 settings = get_settings()
-limiter = Limiter(key_func=get_remote_address)
 
 # Ensure upload directory exists
 UPLOAD_DIR = settings.cache_dir / "uploads"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Media types by extension for uploaded-track streaming
+_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+}
+
 
 class UploadedTrack(BaseModel):
     """Uploaded track information."""
@@ -37,19 +47,6 @@ class TrackListResponse(BaseModel):
     tracks: List[UploadedTrack]
 
 
-# In-memory track database (simple for MVP)
-_tracks_db: dict[int, dict] = {}
-_next_id: int = 1
-
-
-def get_next_id() -> int:
-    """Get next track ID."""
-    global _next_id
-    track_id = _next_id
-    _next_id += 1
-    return track_id
-
-
 @router.delete("/cache")
 async def clear_cache():
     """Clear all cached files (uploads, stems, analysis)."""
@@ -60,16 +57,81 @@ async def clear_cache():
             shutil.rmtree(cache_path)
             cache_path.mkdir(parents=True, exist_ok=True)
 
-    # Clear in-memory database
-    global _tracks_db, _next_id
-    _tracks_db.clear()
-    _next_id = 1
+    # Clear track metadata
+    await track_store.clear()
 
     return {"status": "cache cleared"}
 
 
-@router.post("/upload")
-@limiter.limit("20/minute")
+def _looks_like_audio(head: bytes, ext: str) -> bool:
+    """
+    Check the leading bytes of an upload against the magic numbers for its
+    claimed extension, so a mislabeled 500 MB file is rejected before any
+    disk I/O instead of after analysis fails on it.
+    """
+    if len(head) < 12:
+        return False
+    if ext == ".mp3":
+        # ID3 tag or a raw MPEG frame sync (0xFFEx)
+        return head[:3] == b"ID3" or (head[0] == 0xFF and (head[1] & 0xE0) == 0xE0)
+    if ext == ".wav":
+        return head[:4] == b"RIFF" and head[8:12] == b"WAVE"
+    if ext == ".flac":
+        return head[:4] == b"fLaC"
+    if ext == ".ogg":
+        return head[:4] == b"OggS"
+    if ext == ".m4a":
+        return head[4:8] == b"ftyp"
+    return True
+
+
+def _save_upload(src, dest_path: Path) -> str:
+    """
+    Copy an upload to disk and return its SHA-256 hex digest. Runs in a
+    worker thread so large uploads don't block the event loop.
+
+    Starlette spools big uploads to a real temp file, so os.sendfile can
+    usually move the bytes kernel-to-kernel, after which file_digest hashes
+    the page-cache-warm source with OpenSSL's SHA-NI path. In-memory
+    uploads hash inline during a 1 MiB-buffered copy.
+    """
+    with open(dest_path, "wb") as buffer:
+        try:
+            in_fd = src.fileno()
+        except (AttributeError, OSError, ValueError):
+            in_fd = None
+
+        if in_fd is not None and hasattr(os, "sendfile"):
+            os.lseek(in_fd, 0, os.SEEK_SET)
+            offset = 0
+            while True:
+                sent = os.sendfile(buffer.fileno(), in_fd, offset, 1 << 24)
+                if sent == 0:
+                    break
+                offset += sent
+            src.seek(0)
+            digest = hashlib.file_digest(src, "sha256").hexdigest()
+        else:
+            sha = hashlib.sha256()
+            while chunk := src.read(1024 * 1024):
+                sha.update(chunk)
+                buffer.write(chunk)
+            digest = sha.hexdigest()
+
+        # Uploaded audio is read once (analysis) and then sits cold, but a
+        # multi-hundred-MB write would evict the hot analysis/stem JSON from
+        # the page cache. Flush, then tell the kernel to drop these pages.
+        # (O_DIRECT would avoid the cache entirely but needs 4K-aligned
+        # buffers that don't fit the hash-while-copy loop.)
+        if hasattr(os, "posix_fadvise"):
+            buffer.flush()
+            os.fsync(buffer.fileno())
+            os.posix_fadvise(buffer.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+    return digest
+
+
+@router.post("/upload", dependencies=[Depends(rate_limit(20))])
 async def upload_track(request: Request, file: UploadFile = File(...)) -> UploadedTrack:
     """
     Upload an MP3 file for mixing.
@@ -89,18 +151,37 @@ async def upload_track(request: Request, file: UploadFile = File(...)) -> Upload
             detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
         )
 
-    # Generate unique ID and filename
-    track_id = get_next_id()
-    safe_filename = f"{track_id}_{uuid.uuid4().hex[:8]}{file_ext}"
-    file_path = UPLOAD_DIR / safe_filename
+    # Reject content that doesn't match the claimed format up front
+    head = await file.read(12)
+    await file.seek(0)
+    if not _looks_like_audio(head, file_ext):
+        raise HTTPException(
+            status_code=400,
+            detail="File content does not match its extension",
+        )
+
+    # Generate unique ID and save under a temp name while hashing
+    track_id = await track_store.next_id()
+    tmp_path = UPLOAD_DIR / f".tmp_{track_id}_{uuid.uuid4().hex[:8]}{file_ext}"
 
-    # Save file
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        digest = await asyncio.to_thread(_save_upload, file.file, tmp_path)
     except Exception as e:
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
+    # Content-addressed filename: re-uploading the same bytes reuses the
+    # existing file instead of consuming disk again. Sharding by the first
+    # two digest chars keeps each directory small — one flat directory
+    # degrades stat/open/unlink to O(N) past ~10k entries on ext4.
+    shard_dir = UPLOAD_DIR / digest[:2]
+    shard_dir.mkdir(exist_ok=True)
+    file_path = shard_dir / f"{digest[:16]}{file_ext}"
+    if file_path.exists():
+        tmp_path.unlink()
+    else:
+        os.replace(tmp_path, file_path)
+
     # Extract title from filename (remove extension)
     title = Path(file.filename).stem
 
@@ -116,27 +197,37 @@ async def upload_track(request: Request, file: UploadFile = File(...)) -> Upload
         "duration": 0,  # Will be set after analysis
         "file_path": str(file_path),
     }
-    _tracks_db[track_id] = track_data
+    await track_store.put(track_data)
 
     return UploadedTrack(**track_data)
 
 
-@router.post("/upload-multiple")
-@limiter.limit("10/minute")
+@router.post("/upload-multiple", dependencies=[Depends(rate_limit(10))])
 async def upload_multiple_tracks(
     request: Request,
     files: List[UploadFile] = File(...)
 ) -> TrackListResponse:
-    """Upload multiple audio files at once."""
-    uploaded_tracks = []
+    """
+    Upload multiple audio files at once.
 
-    for file in files:
-        try:
-            track = await upload_track(request, file)
-            uploaded_tracks.append(track)
-        except HTTPException as e:
+    Uploads run concurrently — the saves are I/O-bound thread work, so N
+    files complete in roughly the time of the largest one instead of the
+    sum. Failed files are skipped, matching the old per-file behavior.
+    """
+    results = await asyncio.gather(
+        *(upload_track(request, file) for file in files),
+        return_exceptions=True,
+    )
+
+    uploaded_tracks = []
+    for file, result in zip(files, results):
+        if isinstance(result, HTTPException):
             # Continue with other files if one fails
-            print(f"Failed to upload {file.filename}: {e.detail}")
+            print(f"Failed to upload {file.filename}: {result.detail}")
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            uploaded_tracks.append(result)
 
     return TrackListResponse(tracks=uploaded_tracks)
 
@@ -144,40 +235,33 @@ async def upload_multiple_tracks(
 @router.get("/tracks")
 async def get_uploaded_tracks() -> TrackListResponse:
     """Get list of all uploaded tracks."""
-    tracks = [UploadedTrack(**data) for data in _tracks_db.values()]
+    tracks = [UploadedTrack(**data) for data in await track_store.all()]
     return TrackListResponse(tracks=tracks)
 
 
 @router.get("/tracks/{track_id}")
 async def get_track(track_id: int) -> UploadedTrack:
     """Get a specific uploaded track."""
-    if track_id not in _tracks_db:
+    track = await track_store.get(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
-    return UploadedTrack(**_tracks_db[track_id])
+    return UploadedTrack(**track)
 
 
 @router.get("/tracks/{track_id}/stream")
 async def stream_track(track_id: int):
     """Stream an uploaded track."""
-    if track_id not in _tracks_db:
+    track = await track_store.get(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    track = _tracks_db[track_id]
     file_path = Path(track["file_path"])
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found")
 
     # Determine media type
-    ext = file_path.suffix.lower()
-    media_types = {
-        ".mp3": "audio/mpeg",
-        ".wav": "audio/wav",
-        ".m4a": "audio/mp4",
-        ".ogg": "audio/ogg",
-        ".flac": "audio/flac",
-    }
-    media_type = media_types.get(ext, "audio/mpeg")
+    media_type = _MEDIA_TYPES.get(file_path.suffix.lower(), "audio/mpeg")
 
     # Add headers to prevent any caching
     return FileResponse(
@@ -196,76 +280,84 @@ async def stream_track(track_id: int):
 @router.delete("/tracks/{track_id}")
 async def delete_track(track_id: int):
     """Delete an uploaded track."""
-    if track_id not in _tracks_db:
+    track = await track_store.get(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    track = _tracks_db[track_id]
     file_path = Path(track["file_path"])
 
-    # Delete file
-    if file_path.exists():
-        file_path.unlink()
+    # Remove from database first, then delete the file only if no other
+    # track still references it — content-addressed storage means two
+    # uploads of the same bytes share one file on disk.
+    await track_store.delete(track_id)
 
-    # Remove from database
-    del _tracks_db[track_id]
+    still_referenced = any(
+        other["file_path"] == track["file_path"] for other in await track_store.all()
+    )
+    if not still_referenced and file_path.exists():
+        file_path.unlink()
 
     return {"message": "Track deleted"}
 
 
-@router.post("/tracks/{track_id}/analyze")
-@limiter.limit("20/minute")
+@router.post("/tracks/{track_id}/analyze", dependencies=[Depends(rate_limit(20))])
 async def analyze_uploaded_track(request: Request, track_id: int):
     """Analyze an uploaded track for BPM, key, energy."""
     from app.services import analysis as analysis_service
 
-    if track_id not in _tracks_db:
+    track = await track_store.get(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    track = _tracks_db[track_id]
     file_path = Path(track["file_path"])
 
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Audio file not found")
 
     # Check cache first
-    cached = analysis_service.get_cached_analysis(track_id)
+    cached = await analysis_service.get_cached_analysis_async(track_id)
     if cached:
         # Update duration in track db
         if "duration" in cached.get("beatGrid", {}):
             beats = cached["beatGrid"].get("beats", [])
             if beats:
                 duration_sec = beats[-1] if beats else 0
-                _tracks_db[track_id]["duration"] = int(duration_sec * 1000)
+                await track_store.set_duration(track_id, int(duration_sec * 1000))
         return cached
 
     try:
-        # Perform analysis
-        result = analysis_service.analyze_audio(track_id, file_path)
+        # Perform analysis in the process pool so the event loop stays free
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            request.app.state.cpu_pool,
+            analysis_service.analyze_audio,
+            track_id,
+            file_path,
+        )
 
         # Update duration in track db
         beats = result.get("beatGrid", {}).get("beats", [])
         if beats:
             duration_sec = beats[-1] if beats else 0
-            _tracks_db[track_id]["duration"] = int(duration_sec * 1000)
+            await track_store.set_duration(track_id, int(duration_sec * 1000))
 
         # Cache result
-        analysis_service.cache_analysis(track_id, result)
+        await analysis_service.cache_analysis_async(track_id, result)
 
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
-@router.post("/tracks/{track_id}/stems")
-@limiter.limit("5/minute")
+@router.post("/tracks/{track_id}/stems", dependencies=[Depends(rate_limit(5))])
 async def separate_track_stems(request: Request, track_id: int):
     """Separate track into stems (drums, bass, vocals, other)."""
     from app.services import analysis as analysis_service
 
-    if track_id not in _tracks_db:
+    track = await track_store.get(track_id)
+    if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    track = _tracks_db[track_id]
     file_path = Path(track["file_path"])
 
     if not file_path.exists():
@@ -299,14 +391,10 @@ async def get_track_stem_status(track_id: int):
 
 
 @router.get("/tracks/{track_id}/stems/{stem_name}")
-async def stream_track_stem(track_id: int, stem_name: str):
-    """Stream a specific stem."""
-    from app.config import get_settings
-    settings = get_settings()
-
-    if stem_name not in ["drums", "bass", "vocals", "other"]:
-        raise HTTPException(status_code=400, detail="Invalid stem name")
-
+async def stream_track_stem(
+    track_id: int, stem_name: Literal["drums", "bass", "vocals", "other", "guitar", "piano"]
+):
+    """Stream a specific stem (name validated during route matching)."""
     stem_path = settings.stems_dir / str(track_id) / f"{stem_name}.wav"
 
     if not stem_path.exists():
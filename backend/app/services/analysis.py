@@ -5,19 +5,56 @@ Provides BPM detection, key estimation, energy analysis, and stem separation.
 Uses librosa for audio analysis and optionally Demucs for stem separation.
 """
 
-import json
 import hashlib
+import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 import asyncio
 
 import httpx
 import numpy as np
+import orjson
 
 from app.config import get_settings
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    import redis as redis_lib
+except ImportError:
+    redis_lib = None
+
 settings = get_settings()
 
+
+def _dumps(obj) -> bytes:
+    """Serialize for the analysis cache (orjson, numpy-aware)."""
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _loads(payload: bytes) -> dict:
+    """Deserialize an analysis cache payload."""
+    return orjson.loads(payload)
+
+# Lazily-built Redis client fronting the disk analysis cache. Analyses are
+# immutable once computed, so a long TTL is safe; with
+# `maxmemory-policy allkeys-lfu` the hot keys stay resident. Redis being
+# absent or down just means falling through to disk.
+_redis = None
+_ANALYSIS_TTL = 86400
+
+
+def _get_redis():
+    """Return the shared Redis client, or None when not configured."""
+    global _redis
+    if _redis is None and redis_lib is not None and settings.redis_url:
+        _redis = redis_lib.from_url(settings.redis_url)
+    return _redis
+
 # Camelot wheel mapping for key compatibility
 CAMELOT_MAP = {
     # Minor keys (A)
@@ -64,6 +101,279 @@ KEY_SHORT_NAMES = {
 }
 
 
+PITCH_CLASSES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+# Pseudo-stem filtering runs at a fixed rate and FFT size, so the band
+# edges are fixed bin indices — computed once here instead of rebuilding
+# the FFT frequency axis and boolean masks per call.
+_N_FFT = 2048
+_SR_STEM = 44100
+_FREQS = np.fft.rfftfreq(_N_FFT, 1.0 / _SR_STEM)
+_BASS_HI = int(np.searchsorted(_FREQS, 200))
+_VOX_LO = int(np.searchsorted(_FREQS, 300))
+_VOX_HI = int(np.searchsorted(_FREQS, 4000))
+
+# Krumhansl key profiles, pre-rotated into all 12 transpositions and
+# centered/normalized at import time. Key detection is then a single
+# (24, 12) @ (12,) matvec + argmax — equivalent to 24 Pearson
+# correlations, without np.roll/np.corrcoef temporaries per track.
+_MAJOR_PROFILE = np.array(
+    [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+)
+_MINOR_PROFILE = np.array(
+    [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+)
+_PROFILES = np.vstack(
+    [np.roll(_MAJOR_PROFILE, i) for i in range(12)]
+    + [np.roll(_MINOR_PROFILE, i) for i in range(12)]
+)
+_PROFILES_C = _PROFILES - _PROFILES.mean(axis=1, keepdims=True)
+PROFILES_NORM = _PROFILES_C / np.linalg.norm(_PROFILES_C, axis=1, keepdims=True)
+
+
+def normalize_key(key: str) -> str:
+    """Normalize a key name (short or long form) to '<pitch> major/minor'."""
+    key = key.strip()
+    # Handle short forms
+    if key.endswith("m") and " " not in key:
+        return key[:-1] + " minor"
+    if " " not in key:
+        return key + " major"
+    return key
+
+
+def _camelot(analysis: dict) -> tuple:
+    """
+    Camelot (number, mode) for an analysis dict.
+
+    Prefers the precomputed camelotNum/camelotMode fields written by
+    analyze_audio; falls back to key-name normalization for cached JSONs
+    produced before those fields existed.
+    """
+    num = analysis.get("camelotNum")
+    if num is not None:
+        return num, analysis.get("camelotMode", "A")
+    return CAMELOT_MAP.get(normalize_key(analysis["key"]), (8, "A"))
+
+
+def compat_features(analyses: list) -> np.ndarray:
+    """
+    Extract scoring features from analysis dicts into an (N, 4) float array.
+
+    Columns: BPM, Camelot number, Camelot mode (0 = A/minor, 1 = B/major),
+    energy. This is the input shape for the vectorized pairwise scorer.
+    """
+    feats = np.empty((len(analyses), 4), dtype=np.float64)
+    for i, analysis in enumerate(analyses):
+        num, mode = _camelot(analysis)
+        feats[i, 0] = analysis["bpm"]
+        feats[i, 1] = num
+        feats[i, 2] = 0.0 if mode == "A" else 1.0
+        feats[i, 3] = analysis["energy"]
+    return feats
+
+
+def pairwise_compat(feats: np.ndarray) -> np.ndarray:
+    """
+    Compute the full (N, N) compatibility score matrix.
+
+    Entry [i, j] scores the transition from track i into track j. Uses the
+    Numba-compiled kernel for larger playlists when numba is installed
+    (small N stays on NumPy to avoid paying JIT warmup) and the
+    broadcasting implementation otherwise.
+    """
+    if njit is not None and len(feats) > 20:
+        return _pairwise_compat_jit(np.ascontiguousarray(feats))
+    return _pairwise_compat_numpy(feats)
+
+
+def _pairwise_compat_numpy(feats: np.ndarray) -> np.ndarray:
+    """
+    Broadcasting implementation of the pairwise score matrix.
+
+    Reproduces calculate_compatibility_score for every ordered pair in a
+    handful of NumPy ops instead of N^2 Python calls.
+    """
+    bpm_a = feats[:, 0:1]
+    bpm_b = feats[:, 0][None, :]
+
+    # BPM ladder (40% weight)
+    ratio = np.divide(bpm_a, bpm_b, out=np.ones((len(feats), len(feats))), where=bpm_b > 0)
+    diff = np.abs(1 - ratio) * 100
+    double_diff = np.abs(1 - ratio * 2) * 100
+    half_diff = np.abs(1 - ratio / 2) * 100
+    fallback = np.where(
+        np.minimum(double_diff, half_diff) < 6,
+        80.0,
+        np.maximum(10.0, 50.0 - diff),
+    )
+    bpm_score = np.select(
+        [diff < 1, diff < 3, diff < 6, diff < 10],
+        [100.0, 95.0, 85.0, 70.0],
+        default=fallback,
+    )
+
+    # Key ladder (35% weight)
+    num_a = feats[:, 1:2]
+    num_b = feats[:, 1][None, :]
+    same_mode = feats[:, 2:3] == feats[:, 2][None, :]
+    raw = np.abs(num_a - num_b)
+    distance = np.minimum(raw, 12 - raw)
+    key_score = np.select(
+        [
+            (distance == 0) & same_mode,
+            distance == 0,
+            (distance == 1) & same_mode,
+            distance == 1,
+            distance <= 2,
+        ],
+        [100.0, 80.0, 90.0, 65.0, 55.0],
+        default=np.maximum(20.0, 50.0 - distance * 5),
+    )
+
+    # Energy ladder (25% weight)
+    energy_diff = feats[:, 3][None, :] - feats[:, 3:4]
+    abs_diff = np.abs(energy_diff)
+    energy_score = np.select(
+        [
+            (energy_diff >= 0) & (energy_diff < 0.15),
+            abs_diff < 0.1,
+            (energy_diff >= 0.15) & (energy_diff < 0.3),
+            (energy_diff >= -0.15) & (energy_diff < 0),
+            abs_diff < 0.3,
+            abs_diff < 0.5,
+        ],
+        [100.0, 95.0, 85.0, 80.0, 70.0, 55.0],
+        default=40.0,
+    )
+
+    return (bpm_score * 0.4 + key_score * 0.35 + energy_score * 0.25).astype(np.int64)
+
+
+if njit is not None:
+
+    @njit(fastmath=True, cache=True)
+    def _score_pair(bpm_a, num_a, mode_a, energy_a, bpm_b, num_b, mode_b, energy_b):
+        """Scalar scoring kernel: same ladder as the Python helpers."""
+        ratio = bpm_a / bpm_b if bpm_b > 0 else 1.0
+        diff = abs(1 - ratio) * 100
+        if diff < 1:
+            bpm_score = 100.0
+        elif diff < 3:
+            bpm_score = 95.0
+        elif diff < 6:
+            bpm_score = 85.0
+        elif diff < 10:
+            bpm_score = 70.0
+        else:
+            double_diff = abs(1 - ratio * 2) * 100
+            half_diff = abs(1 - ratio / 2) * 100
+            if min(double_diff, half_diff) < 6:
+                bpm_score = 80.0
+            else:
+                bpm_score = max(10.0, 50.0 - diff)
+
+        raw = abs(num_a - num_b)
+        distance = min(raw, 12 - raw)
+        same_mode = mode_a == mode_b
+        if distance == 0 and same_mode:
+            key_score = 100.0
+        elif distance == 0:
+            key_score = 80.0
+        elif distance == 1 and same_mode:
+            key_score = 90.0
+        elif distance == 1:
+            key_score = 65.0
+        elif distance <= 2:
+            key_score = 55.0
+        else:
+            key_score = max(20.0, 50.0 - distance * 5)
+
+        energy_diff = energy_b - energy_a
+        abs_diff = abs(energy_diff)
+        if 0 <= energy_diff < 0.15:
+            energy_score = 100.0
+        elif abs_diff < 0.1:
+            energy_score = 95.0
+        elif 0.15 <= energy_diff < 0.3:
+            energy_score = 85.0
+        elif -0.15 <= energy_diff < 0:
+            energy_score = 80.0
+        elif abs_diff < 0.3:
+            energy_score = 70.0
+        elif abs_diff < 0.5:
+            energy_score = 55.0
+        else:
+            energy_score = 40.0
+
+        return int(bpm_score * 0.4 + key_score * 0.35 + energy_score * 0.25)
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def score_one_to_many(feat_a, feats):
+        """Score one track's transition into each row of `feats`."""
+        n = feats.shape[0]
+        out = np.empty(n, dtype=np.int64)
+        for j in prange(n):
+            out[j] = _score_pair(
+                feat_a[0], feat_a[1], feat_a[2], feat_a[3],
+                feats[j, 0], feats[j, 1], feats[j, 2], feats[j, 3],
+            )
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pairwise_compat_jit(feats):
+        """Numba kernel: _score_pair over every ordered pair."""
+        n = feats.shape[0]
+        out = np.empty((n, n), dtype=np.int64)
+        for i in prange(n):
+            for j in range(n):
+                out[i, j] = _score_pair(
+                    feats[i, 0], feats[i, 1], feats[i, 2], feats[i, 3],
+                    feats[j, 0], feats[j, 1], feats[j, 2], feats[j, 3],
+                )
+        return out
+
+else:
+
+    def score_one_to_many(feat_a, feats):
+        """Python fallback: one row of the pairwise matrix via the ladders."""
+        out = np.empty(len(feats), dtype=np.int64)
+        for j in range(len(feats)):
+            out[j] = int(
+                _bpm_score(feat_a[0], feats[j, 0]) * 0.4
+                + _key_score(feat_a[1], feat_a[2], feats[j, 1], feats[j, 2]) * 0.35
+                + _energy_score(feat_a[3], feats[j, 3]) * 0.25
+            )
+        return out
+
+
+# Shared download client, created lazily on the first download: a per-call
+# AsyncClient pays TCP+TLS setup for every track, which dominates when a
+# batch of short downloads hits the same host.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared download client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared download client (called from app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 async def download_audio_for_analysis(track_id: int, token: str) -> Optional[Path]:
     """
     Download audio from SoundCloud for analysis.
@@ -82,57 +392,124 @@ async def download_audio_for_analysis(track_id: int, token: str) -> Optional[Pat
         return audio_path
 
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=60.0) as client:
-            # Get track info
-            track_response = await client.get(
-                f"https://api.soundcloud.com/tracks/{track_id}",
+        client = _get_client()
+        # Get track info
+        track_response = await client.get(
+            f"https://api.soundcloud.com/tracks/{track_id}",
+            headers={"Authorization": f"OAuth {token}"},
+        )
+
+        if track_response.status_code != 200:
+            return None
+
+        track_data = track_response.json()
+
+        # Try to get stream URL
+        stream_url = track_data.get("stream_url")
+        if not stream_url:
+            # Try streams endpoint
+            streams_response = await client.get(
+                f"https://api.soundcloud.com/tracks/{track_id}/streams",
                 headers={"Authorization": f"OAuth {token}"},
             )
 
-            if track_response.status_code != 200:
-                return None
-
-            track_data = track_response.json()
-
-            # Try to get stream URL
-            stream_url = track_data.get("stream_url")
-            if not stream_url:
-                # Try streams endpoint
-                streams_response = await client.get(
-                    f"https://api.soundcloud.com/tracks/{track_id}/streams",
-                    headers={"Authorization": f"OAuth {token}"},
+            if streams_response.status_code == 200:
+                streams_data = streams_response.json()
+                stream_url = streams_data.get(
+                    "http_mp3_128_url",
+                    streams_data.get("progressive_url"),
                 )
 
-                if streams_response.status_code == 200:
-                    streams_data = streams_response.json()
-                    stream_url = streams_data.get(
-                        "http_mp3_128_url",
-                        streams_data.get("progressive_url"),
-                    )
-
-            if not stream_url:
-                return None
-
-            # Download audio
-            audio_response = await client.get(
-                stream_url,
-                headers={"Authorization": f"OAuth {token}"},
-            )
-
+        if not stream_url:
+            return None
+
+        # Download audio, streaming straight to disk: buffering a whole
+        # MP3 as bytes costs 5-15 MB of peak RSS per concurrent download.
+        # Write to a .part file and rename so the cache check above never
+        # sees a half-written file.
+        part_path = audio_path.with_suffix(".mp3.part")
+        async with client.stream(
+            "GET",
+            stream_url,
+            headers={"Authorization": f"OAuth {token}"},
+        ) as audio_response:
             if audio_response.status_code != 200:
                 return None
 
-            # Save to file
-            with open(audio_path, "wb") as f:
-                f.write(audio_response.content)
+            with open(part_path, "wb") as f:
+                async for chunk in audio_response.aiter_bytes(65536):
+                    f.write(chunk)
 
-            return audio_path
+        os.replace(part_path, audio_path)
+        return audio_path
 
     except Exception as e:
         print(f"Error downloading audio: {e}")
         return None
 
 
+def _load_audio(audio_path: Path, sr: int) -> tuple:
+    """
+    Decode an audio file to mono float at the requested sample rate.
+
+    Prefers torchaudio's C++ decode/resample path when torch is installed:
+    decoding dominates analysis wall time and torchaudio is several times
+    faster than librosa's audioread fallback, without the numba import tax.
+    Next choice is soundfile + soxr — soxr's 'QQ' quality is an order of
+    magnitude faster than librosa's default kaiser_best resampler and
+    plenty for BPM/key/energy features. librosa remains the last resort.
+    """
+    try:
+        import torchaudio
+
+        waveform, orig_sr = torchaudio.load(str(audio_path))
+        if waveform.shape[0] > 1:
+            waveform = waveform.mean(dim=0, keepdim=True)
+        if orig_sr != sr:
+            waveform = torchaudio.functional.resample(waveform, orig_sr, sr)
+        return waveform.squeeze(0).numpy(), sr
+    except ImportError:
+        pass
+
+    try:
+        import soundfile as sf
+        import soxr
+
+        data, native_sr = sf.read(str(audio_path), dtype="float32", always_2d=False)
+        if data.ndim == 2:
+            data = data.mean(axis=1)
+        if native_sr != sr:
+            data = soxr.resample(data, native_sr, sr, quality="QQ")
+        return data, sr
+    except (ImportError, RuntimeError):
+        # soundfile can't decode MP3 on older libsndfile builds
+        import librosa
+
+        return librosa.load(str(audio_path), sr=sr, mono=True)
+
+
+def _load_audio_cached(audio_path: Path, sr: int) -> np.ndarray:
+    """
+    Decode to mono float32 at `sr`, memoized on disk per (file, rate).
+
+    Decode dominates the wall time of both analysis (22050 Hz) and the
+    pseudo-stem fallback (44100 Hz); when a track goes through both, or a
+    stage reruns, the .npy sidecar turns the second decode into an mmap.
+    Keyed on the source file's mtime so replaced audio re-decodes.
+    """
+    spec_dir = settings.cache_dir / "spec"
+    spec_dir.mkdir(parents=True, exist_ok=True)
+    pcm_path = spec_dir / f"{audio_path.stem}_{sr}.npy"
+
+    if pcm_path.exists() and pcm_path.stat().st_mtime >= audio_path.stat().st_mtime:
+        return np.load(pcm_path, mmap_mode="r")
+
+    y, _ = _load_audio(audio_path, sr)
+    y = np.asarray(y, dtype=np.float32)
+    np.save(pcm_path, y)
+    return y
+
+
 def analyze_audio(track_id: int, audio_path: Path) -> dict:
     """
     Perform full audio analysis using librosa.
@@ -141,8 +518,9 @@ def analyze_audio(track_id: int, audio_path: Path) -> dict:
     """
     import librosa
 
-    # Load audio
-    y, sr = librosa.load(str(audio_path), sr=22050, mono=True)
+    # Load audio (decoded-PCM disk cache behind the decode)
+    sr = 22050
+    y = _load_audio_cached(audio_path, sr)
     duration = len(y) / sr
 
     # BPM and beat detection
@@ -158,69 +536,76 @@ def analyze_audio(track_id: int, audio_path: Path) -> dict:
     # Downbeat detection (estimate every 4 beats)
     downbeats = beat_times[::4] if len(beat_times) >= 4 else beat_times
 
-    # Key detection using chroma features
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    chroma_avg = np.mean(chroma, axis=1)
-
-    # Simple key detection: find strongest pitch class
-    key_index = int(np.argmax(chroma_avg))
-    pitch_classes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-
-    # Estimate major/minor using correlation with typical profiles
-    major_profile = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
-    minor_profile = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
-
-    # Rotate profiles to match detected key
-    major_corr = np.corrcoef(np.roll(major_profile, key_index), chroma_avg)[0, 1]
-    minor_corr = np.corrcoef(np.roll(minor_profile, key_index), chroma_avg)[0, 1]
+    # Per-frame RMS, used for the energy features below and to weight the
+    # chroma average (same default hop of 512 as chroma_cqt)
+    rms = librosa.feature.rms(y=y)[0]
 
-    key_mode = "major" if major_corr > minor_corr else "minor"
-    key_name = f"{pitch_classes[key_index]} {key_mode}"
-    key_short = KEY_SHORT_NAMES.get(key_name, pitch_classes[key_index])
+    # Key detection using chroma features, weighted by frame energy so
+    # silent intros/outros don't bias the pitch-class profile
+    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+    n_frames = min(chroma.shape[1], len(rms))
+    w = rms[:n_frames].astype(np.float64)
+    w /= w.sum() + 1e-9
+    chroma_avg = chroma[:, :n_frames] @ w
+
+    # Key detection: correlate against all 24 pre-rotated profiles at once.
+    # With both sides centered and unit-normalized the dot products are
+    # Pearson correlations, so argmax picks tonic and mode together.
+    c = chroma_avg - chroma_avg.mean()
+    c /= np.linalg.norm(c) + 1e-9
+    best = int(np.argmax(PROFILES_NORM @ c))
+    key_index = best % 12
+    key_mode = "major" if best < 12 else "minor"
+    key_name = f"{PITCH_CLASSES[key_index]} {key_mode}"
+    key_short = KEY_SHORT_NAMES.get(key_name, PITCH_CLASSES[key_index])
 
     # Get Camelot number
     camelot = CAMELOT_MAP.get(key_name, (8, "A"))
     key_number = camelot[0]
 
-    # Energy analysis (RMS)
-    rms = librosa.feature.rms(y=y)[0]
+    # Energy analysis (RMS computed above)
     energy = float(np.mean(rms))
     # Normalize energy to 0-1
     energy = min(1.0, energy / 0.1)
 
-    # Energy curve (downsample for frontend)
-    energy_curve = []
-    chunk_size = len(rms) // 100
-    if chunk_size > 0:
-        for i in range(0, len(rms), chunk_size):
-            chunk = rms[i:i + chunk_size]
-            energy_curve.append(float(np.mean(chunk)))
+    # Energy curve (downsample to ~100 points for frontend): mean of each
+    # chunk via one reduceat instead of a Python loop of np.mean calls
+    if len(rms) > 100:
+        idx = np.linspace(0, len(rms), 101, dtype=np.int64)
+        energy_curve = np.add.reduceat(rms, idx[:-1]) / np.maximum(np.diff(idx), 1)
     else:
-        energy_curve = rms.tolist()
+        energy_curve = rms.astype(np.float64)
 
     # Normalize energy curve
-    max_energy = max(energy_curve) if energy_curve else 1
-    energy_curve = [e / max_energy for e in energy_curve]
+    max_energy = energy_curve.max() if len(energy_curve) else 1.0
+    if max_energy > 0:
+        energy_curve = energy_curve / max_energy
 
     # Detect peaks/drops using onset strength
     onset_env = librosa.onset.onset_strength(y=y, sr=sr)
     peaks_frames = librosa.util.peak_pick(onset_env, pre_max=3, post_max=3, pre_avg=3, post_avg=5, delta=0.5, wait=10)
-    peaks = librosa.frames_to_time(peaks_frames, sr=sr).tolist()
+    peaks_frames = np.asarray(peaks_frames, dtype=np.int64)
+    peaks_frames = peaks_frames[peaks_frames < len(onset_env)]
+    peaks_times = librosa.frames_to_time(peaks_frames, sr=sr)
 
     # Filter to significant peaks only
-    if len(peaks) > 20:
-        # Keep only top 20 peaks by onset strength
-        peak_strengths = [onset_env[int(f)] for f in peaks_frames if int(f) < len(onset_env)]
-        sorted_indices = np.argsort(peak_strengths)[-20:]
-        peaks = [peaks[i] for i in sorted_indices if i < len(peaks)]
-        peaks.sort()
-
-    # Detect drops (sudden energy increases after low energy)
-    drops = []
-    for i in range(1, len(energy_curve) - 1):
-        if energy_curve[i] < 0.3 and energy_curve[i + 1] > 0.6:
-            drop_time = (i / len(energy_curve)) * duration
-            drops.append(drop_time)
+    if len(peaks_frames) > 20:
+        # Keep only top 20 peaks by onset strength: fancy-index the
+        # strengths and argpartition (O(N) selection vs full argsort)
+        peak_strengths = onset_env[peaks_frames]
+        top_indices = np.argpartition(peak_strengths, -20)[-20:]
+        peaks_times = np.sort(peaks_times[top_indices])
+    peaks = peaks_times.tolist()
+
+    # Detect drops (sudden energy increases after low energy): one boolean
+    # mask over adjacent curve points instead of a Python comparison loop
+    if len(energy_curve) > 2:
+        lo = energy_curve[1:-1] < 0.3
+        hi = energy_curve[2:] > 0.6
+        drop_idx = np.flatnonzero(lo & hi) + 1
+        drops = (drop_idx / len(energy_curve) * duration).tolist()
+    else:
+        drops = []
 
     # Calculate phrase markers (every 8 or 16 bars)
     if bpm > 0 and len(beat_times) > 0:
@@ -241,8 +626,10 @@ def analyze_audio(track_id: int, audio_path: Path) -> dict:
         "key": key_short,
         "keyNumber": key_number,
         "keyMode": key_mode,
+        "camelotNum": camelot[0],
+        "camelotMode": camelot[1],
         "energy": round(energy, 3),
-        "energyCurve": [round(e, 3) for e in energy_curve[:100]],
+        "energyCurve": np.round(energy_curve[:100], 3).tolist(),
         "beatGrid": {
             "bpm": round(bpm, 1),
             "downbeats": [round(d, 3) for d in downbeats[:50]],
@@ -255,111 +642,260 @@ def analyze_audio(track_id: int, audio_path: Path) -> dict:
     }
 
 
+async def analyze_audio_async(track_id: int, audio_path: Path, executor=None) -> dict:
+    """
+    Run analyze_audio without blocking the event loop.
+
+    Given an executor (the app's process pool) the analysis runs in a
+    separate process; otherwise it goes to a worker thread, where the
+    soundfile decode and NumPy/FFT heavy lifting release the GIL, so
+    concurrent analyses still scale across cores.
+    """
+    loop = asyncio.get_running_loop()
+    if executor is not None:
+        return await loop.run_in_executor(executor, analyze_audio, track_id, audio_path)
+    return await asyncio.to_thread(analyze_audio, track_id, audio_path)
+
+
 def cache_analysis(track_id: int, analysis: dict) -> None:
-    """Save analysis to disk cache."""
+    """Save analysis to the disk cache (and Redis when configured)."""
+    cache_path = settings.analysis_dir / f"{track_id}.json"
+    # orjson: analyses are float-heavy (beats, energyCurve) where it's ~5x
+    # faster than the stdlib encoder, and it serializes any stray numpy
+    # scalars/arrays without a tolist() round-trip
+    payload = _dumps(analysis)
+    cache_path.write_bytes(payload)
+
+    r = _get_redis()
+    if r is not None:
+        try:
+            r.set(f"analysis:{track_id}", payload, ex=_ANALYSIS_TTL)
+        except redis_lib.RedisError:
+            pass  # disk cache is the source of truth
+
+
+@lru_cache(maxsize=4096)
+def _load_analysis(track_id: int, mtime: float) -> dict:
+    """
+    Read and parse an analysis JSON from disk, memoized per (id, mtime).
+
+    Keying on the file's mtime makes rewrites invalidate naturally: a
+    fresh cache_analysis bumps the mtime and the stale entry just ages
+    out of the LRU. Pairwise compatibility sweeps re-read every track
+    per pair, so this turns O(N^2) parses into O(N).
+    """
     cache_path = settings.analysis_dir / f"{track_id}.json"
-    with open(cache_path, "w") as f:
-        json.dump(analysis, f)
+    return _loads(cache_path.read_bytes())
 
 
 def get_cached_analysis(track_id: int) -> Optional[dict]:
-    """Load analysis from disk cache."""
+    """Load analysis from Redis when configured, falling back to disk."""
+    r = _get_redis()
+    if r is not None:
+        try:
+            payload = r.get(f"analysis:{track_id}")
+            if payload is not None:
+                return _loads(payload)
+        except redis_lib.RedisError:
+            pass
+
     cache_path = settings.analysis_dir / f"{track_id}.json"
     if cache_path.exists():
-        with open(cache_path, "r") as f:
-            return json.load(f)
+        analysis = _load_analysis(track_id, cache_path.stat().st_mtime)
+        if r is not None:
+            try:
+                r.set(f"analysis:{track_id}", _dumps(analysis), ex=_ANALYSIS_TTL)
+            except redis_lib.RedisError:
+                pass
+        return analysis
     return None
 
 
+async def get_cached_analysis_async(track_id: int) -> Optional[dict]:
+    """
+    Event-loop-safe get_cached_analysis.
+
+    The sync version does a blocking Redis round-trip (plus disk IO on a
+    miss), so route handlers go through a worker thread — same pattern as
+    the playlist smart-order reads.
+    """
+    return await asyncio.to_thread(get_cached_analysis, track_id)
+
+
+async def cache_analysis_async(track_id: int, analysis: dict) -> None:
+    """Event-loop-safe cache_analysis (blocking disk + Redis writes)."""
+    await asyncio.to_thread(cache_analysis, track_id, analysis)
+
+
+# Stem-separation queue: separation saturates the CPU, so a single
+# consumer runs jobs one at a time (model load is amortized by the
+# persistent worker process). Already-queued jobs are drained together so
+# per-drain setup (status writes, Demucs probe) is shared, but there is
+# no batched forward pass, so the drain never waits for more work.
+_STEM_DRAIN_MAX = 4
+
+_stem_queue: Optional[asyncio.Queue] = None
+_stem_worker_task = None
+
+
+def start_stem_worker() -> None:
+    """
+    Create the stem queue and consumer task on the current event loop.
+
+    Called from the app's lifespan startup: an asyncio.Queue binds to the
+    loop it is first used on, so lazily-created module globals would
+    outlive the loop across an in-process restart (TestClient re-entry)
+    and raise on the next use.
+    """
+    global _stem_queue, _stem_worker_task
+    _stem_queue = asyncio.Queue()
+    _stem_worker_task = asyncio.create_task(_stem_worker())
+
+
+async def stop_stem_worker() -> None:
+    """Cancel the consumer and drop the queue (lifespan shutdown)."""
+    global _stem_queue, _stem_worker_task
+    if _stem_worker_task is not None:
+        _stem_worker_task.cancel()
+        try:
+            await _stem_worker_task
+        except asyncio.CancelledError:
+            pass
+    _stem_worker_task = None
+    _stem_queue = None
+
+
 async def separate_stems(track_id: int, audio_path: Path) -> dict:
     """
     Separate audio into stems using Demucs.
 
+    Jobs go through a queue consumed by a single background worker, so
+    concurrent requests run serially instead of thrashing the CPU.
     Returns dict with stem URLs/paths and status.
     """
+    if _stem_queue is None or _stem_worker_task.get_loop() is not asyncio.get_running_loop():
+        # Direct service use outside the app lifespan (tests, scripts): create
+        # on first use, and re-create if a previous loop left stale globals
+        start_stem_worker()
+
+    fut = asyncio.get_running_loop().create_future()
+    await _stem_queue.put((track_id, audio_path, fut))
+    return await fut
+
+
+async def _stem_worker() -> None:
+    """Consume the stem queue, draining any jobs already waiting."""
+    while True:
+        batch = [await _stem_queue.get()]
+        while len(batch) < _STEM_DRAIN_MAX:
+            try:
+                batch.append(_stem_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        # An escaping exception here would kill the consumer task and
+        # leave every later caller awaiting a future nobody resolves, so
+        # failures are pushed into the batch's futures instead.
+        try:
+            results = await _separate_stems_batch(
+                [(tid, path) for tid, path, _ in batch]
+            )
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+
+        for (track_id, _, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+
+def _atomic_write_json(path: Path, obj: dict) -> None:
+    """Write JSON via a temp file + rename so readers never see a torn file."""
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_bytes(orjson.dumps(obj))
+    os.replace(tmp, path)
+
+
+def _write_status(track_id: int, status: dict) -> dict:
+    """Persist a track's stem status file (atomically — pollers read it)."""
+    status_file = settings.stems_dir / str(track_id) / "status.json"
+    _atomic_write_json(status_file, status)
+    return status
+
+
+def _ready_status(track_id: int) -> dict:
+    """Build the ready status from the stem WAVs actually on disk.
+
+    Globbing instead of hard-coding the four htdemucs names means a
+    six-stem model (htdemucs_6s) is reflected without code changes.
+    """
+    status = {"trackId": track_id, "status": "ready"}
     stem_dir = settings.stems_dir / str(track_id)
-    stem_dir.mkdir(parents=True, exist_ok=True)
+    for stem_path in sorted(stem_dir.glob("*.wav")):
+        status[stem_path.stem] = f"/api/tracks/{track_id}/stems/{stem_path.stem}"
+    return status
 
-    status_file = stem_dir / "status.json"
 
-    # Check if already done
-    if (stem_dir / "drums.wav").exists():
-        return get_stem_status(track_id)
+async def _separate_stems_batch(jobs: list) -> list:
+    """
+    Separate stems for a batch of (track_id, audio_path) jobs.
 
-    # Update status to processing
-    status = {
-        "trackId": track_id,
-        "status": "processing",
-    }
-    with open(status_file, "w") as f:
-        json.dump(status, f)
+    Tracks run serially through the persistent worker process (which
+    keeps the model resident, so only the first job pays the load);
+    the batch just shares the Demucs probe and status bookkeeping.
+    Falls back to per-track pseudo-stems when Demucs is not installed.
+    """
+    results: dict[int, dict] = {}
+    pending = []
 
-    try:
-        # Try to import demucs
+    for track_id, audio_path in jobs:
+        stem_dir = settings.stems_dir / str(track_id)
+        stem_dir.mkdir(parents=True, exist_ok=True)
+
+        # Check if already done
+        if (stem_dir / "drums.wav").exists():
+            results[track_id] = get_stem_status(track_id)
+            continue
+
+        _write_status(track_id, {"trackId": track_id, "status": "processing"})
+        pending.append((track_id, audio_path, stem_dir))
+
+    if pending:
         try:
-            import demucs.separate
-            import torch
-
-            # Run demucs separation
-            # Use htdemucs model (4 stems: drums, bass, vocals, other)
-            device = settings.demucs_device
-            if device == "cuda" and not torch.cuda.is_available():
-                device = "cpu"
-
-            # Run in separate process to avoid blocking
-            import sys
-            cmd = [
-                sys.executable, "-m", "demucs.separate",
-                "-n", settings.demucs_model,
-                "-d", device,
-                "-o", str(stem_dir.parent),
-                str(audio_path)
-            ]
-
-            import subprocess
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-
-            if result.returncode != 0:
-                raise Exception(f"Demucs failed: {result.stderr}")
-
-            # Move stems to correct location
-            demucs_output = stem_dir.parent / settings.demucs_model / audio_path.stem
-            for stem_name in ["drums", "bass", "vocals", "other"]:
-                src = demucs_output / f"{stem_name}.wav"
-                dst = stem_dir / f"{stem_name}.wav"
-                if src.exists():
-                    src.rename(dst)
+            import demucs.separate  # noqa: F401 -- probe whether Demucs exists
 
+            have_demucs = True
         except ImportError:
-            # Demucs not installed, use fallback pseudo-stems
-            await create_pseudo_stems(audio_path, stem_dir)
-
-        # Update status to ready
-        status = {
-            "trackId": track_id,
-            "status": "ready",
-            "drums": f"/api/tracks/{track_id}/stems/drums",
-            "bass": f"/api/tracks/{track_id}/stems/bass",
-            "vocals": f"/api/tracks/{track_id}/stems/vocals",
-            "other": f"/api/tracks/{track_id}/stems/other",
-        }
-        with open(status_file, "w") as f:
-            json.dump(status, f)
-
-        return status
+            have_demucs = False
 
-    except Exception as e:
-        status = {
-            "trackId": track_id,
-            "status": "error",
-            "error": str(e),
-        }
-        with open(status_file, "w") as f:
-            json.dump(status, f)
-        return status
+        for track_id, audio_path, stem_dir in pending:
+            try:
+                if have_demucs:
+                    # Persistent worker: the model stays loaded across jobs
+                    # and batches, so only the first call pays the load
+                    from app.services.stem_worker import stem_worker
+
+                    await asyncio.to_thread(
+                        stem_worker.separate, track_id, audio_path, stem_dir
+                    )
+                else:
+                    # Demucs not installed, use fallback pseudo-stems
+                    # (CPU-bound, so push them off the event loop)
+                    await asyncio.to_thread(create_pseudo_stems, audio_path, stem_dir)
+
+                results[track_id] = _write_status(track_id, _ready_status(track_id))
+            except Exception as e:
+                results[track_id] = _write_status(
+                    track_id,
+                    {"trackId": track_id, "status": "error", "error": str(e)},
+                )
+
+    return [results[track_id] for track_id, _ in jobs]
 
 
-async def create_pseudo_stems(audio_path: Path, output_dir: Path) -> None:
+def create_pseudo_stems(audio_path: Path, output_dir: Path) -> None:
     """
     Create pseudo-stems using EQ/filtering when Demucs is not available.
 
@@ -372,156 +908,152 @@ async def create_pseudo_stems(audio_path: Path, output_dir: Path) -> None:
     import librosa
     import soundfile as sf
 
-    # Load audio
-    y, sr = librosa.load(str(audio_path), sr=44100, mono=False)
-    if y.ndim == 1:
-        y = np.stack([y, y])
-
-    # Convert to mono for processing
-    y_mono = librosa.to_mono(y)
+    # Load mono directly: everything below processes a single channel, so
+    # the old stereo load + channel stack + to_mono was three full passes
+    # over the PCM for nothing (and goes through the decoded-PCM cache now)
+    sr = 44100
+    y_mono = _load_audio_cached(audio_path, sr)
 
     # Drums: Emphasize transients and high frequencies
     # Use harmonic-percussive separation
     y_harmonic, y_percussive = librosa.effects.hpss(y_mono)
     drums = y_percussive
 
+    # Bass and vocals: band slices of one shared STFT, copied into a single
+    # reused zeroed buffer. Slice assignment writes only the band bins,
+    # versus a mask multiply touching every bin in the spectrogram.
+    stft = librosa.stft(y_mono, n_fft=_N_FFT)
+    stft_band = np.zeros_like(stft)
+
     # Bass: Low-pass filter below 200Hz
-    bass = librosa.effects.preemphasis(y_mono, coef=-0.97)
-    # Simple low-pass using FFT
-    stft = librosa.stft(y_mono)
-    freqs = librosa.fft_frequencies(sr=sr)
-    bass_mask = freqs < 200
-    stft_bass = stft.copy()
-    stft_bass[~bass_mask, :] = 0
-    bass = librosa.istft(stft_bass)
+    stft_band[:_BASS_HI] = stft[:_BASS_HI]
+    bass = librosa.istft(stft_band)
 
     # Vocals: Band-pass 300Hz - 4kHz
-    vocal_mask = (freqs > 300) & (freqs < 4000)
-    stft_vocals = stft.copy()
-    stft_vocals[~vocal_mask, :] = 0
-    vocals = librosa.istft(stft_vocals)
+    stft_band[:] = 0
+    stft_band[_VOX_LO:_VOX_HI] = stft[_VOX_LO:_VOX_HI]
+    vocals = librosa.istft(stft_band)
+    del stft, stft_band
 
     # Other: Everything else (harmonic content)
     other = y_harmonic
 
-    # Normalize and save
+    # Normalize and save. The abs scratch and pad buffer are allocated once
+    # and reused across stems, and scaling happens in place, so this pass
+    # stops allocating two signal-length temporaries per stem.
+    n_samples = len(y_mono)
+    scratch = np.empty(n_samples, dtype=np.float32)
+    padded = np.zeros(n_samples, dtype=np.float32)
     for name, stem in [("drums", drums), ("bass", bass), ("vocals", vocals), ("other", other)]:
-        # Normalize
-        max_val = np.max(np.abs(stem))
+        # Ensure same length as original
+        stem = np.asarray(stem[:n_samples], dtype=np.float32)
+        n = len(stem)
+
+        # Normalize in place
+        np.abs(stem, out=scratch[:n])
+        max_val = scratch[:n].max() if n else 0.0
         if max_val > 0:
-            stem = stem / max_val * 0.9
+            np.multiply(stem, 0.9 / max_val, out=stem)
 
-        # Ensure same length as original
-        if len(stem) < len(y_mono):
-            stem = np.pad(stem, (0, len(y_mono) - len(stem)))
-        else:
-            stem = stem[:len(y_mono)]
+        if n < n_samples:
+            padded[:n] = stem
+            padded[n:] = 0.0
+            stem = padded
 
-        # Save as wav
+        # Save as int16 PCM wav: half the bytes of the float32 default
+        # (and half the bandwidth when the browser fetches the stem),
+        # inaudible for already-masked audio
+        stem_i16 = np.clip(stem * 32767.0, -32768, 32767).astype(np.int16)
         output_path = output_dir / f"{name}.wav"
-        sf.write(str(output_path), stem, sr)
+        sf.write(str(output_path), stem_i16, sr, subtype="PCM_16")
 
 
 def get_stem_status(track_id: int) -> Optional[dict]:
     """Get stem separation status for a track."""
     status_file = settings.stems_dir / str(track_id) / "status.json"
     if status_file.exists():
-        with open(status_file, "r") as f:
-            return json.load(f)
+        return orjson.loads(status_file.read_bytes())
     return None
 
 
-def calculate_compatibility_score(analysis_a: dict, analysis_b: dict) -> int:
-    """
-    Calculate mix compatibility score between two tracks.
-
-    Returns score 0-100 based on BPM, key, and energy compatibility.
-    """
-    # BPM compatibility (40% weight)
-    bpm_a = analysis_a["bpm"]
-    bpm_b = analysis_b["bpm"]
-    bpm_ratio = bpm_a / bpm_b if bpm_b > 0 else 1
-
+def _bpm_score(bpm_a: float, bpm_b: float) -> float:
+    """BPM compatibility ladder (40% weight), including double/half time."""
+    bpm_ratio = bpm_a / bpm_b if bpm_b > 0 else 1.0
     bpm_diff = abs(1 - bpm_ratio) * 100
     if bpm_diff < 1:
-        bpm_score = 100
-    elif bpm_diff < 3:
-        bpm_score = 95
-    elif bpm_diff < 6:
-        bpm_score = 85
-    elif bpm_diff < 10:
-        bpm_score = 70
-    else:
-        # Check double/half time
-        double_diff = abs(1 - bpm_ratio * 2) * 100
-        half_diff = abs(1 - bpm_ratio / 2) * 100
-        if min(double_diff, half_diff) < 6:
-            bpm_score = 80
-        else:
-            bpm_score = max(10, 50 - bpm_diff)
-
-    # Key compatibility (35% weight)
-    key_a = f"{analysis_a['key'].replace('m', ' minor') if 'm' in analysis_a['key'] else analysis_a['key'] + ' major'}"
-    key_b = f"{analysis_b['key'].replace('m', ' minor') if 'm' in analysis_b['key'] else analysis_b['key'] + ' major'}"
-
-    # Normalize key names
-    def normalize_key(key: str) -> str:
-        key = key.strip()
-        # Handle short forms
-        if key.endswith("m") and " " not in key:
-            return key[:-1] + " minor"
-        if " " not in key:
-            return key + " major"
-        return key
-
-    key_a = normalize_key(analysis_a["key"])
-    key_b = normalize_key(analysis_b["key"])
-
-    camelot_a = CAMELOT_MAP.get(key_a, (8, "A"))
-    camelot_b = CAMELOT_MAP.get(key_b, (8, "A"))
-
-    num_a, mode_a = camelot_a
-    num_b, mode_b = camelot_b
-
+        return 100.0
+    if bpm_diff < 3:
+        return 95.0
+    if bpm_diff < 6:
+        return 85.0
+    if bpm_diff < 10:
+        return 70.0
+    # Check double/half time
+    double_diff = abs(1 - bpm_ratio * 2) * 100
+    half_diff = abs(1 - bpm_ratio / 2) * 100
+    if min(double_diff, half_diff) < 6:
+        return 80.0
+    return max(10.0, 50.0 - bpm_diff)
+
+
+def _key_score(num_a: int, mode_a: str, num_b: int, mode_b: str) -> float:
+    """Camelot-wheel key compatibility ladder (35% weight)."""
     if num_a == num_b and mode_a == mode_b:
-        key_score = 100  # Perfect match
-    elif num_a == num_b:
-        key_score = 80  # Relative major/minor
-    else:
-        distance = min(abs(num_a - num_b), 12 - abs(num_a - num_b))
-        if distance == 1 and mode_a == mode_b:
-            key_score = 90  # Adjacent
-        elif distance == 1:
-            key_score = 65  # Adjacent different mode
-        elif distance <= 2:
-            key_score = 55
-        else:
-            key_score = max(20, 50 - distance * 5)
-
-    # Energy flow (25% weight)
-    energy_a = analysis_a["energy"]
-    energy_b = analysis_b["energy"]
+        return 100.0  # Perfect match
+    if num_a == num_b:
+        return 80.0  # Relative major/minor
+    distance = min(abs(num_a - num_b), 12 - abs(num_a - num_b))
+    if distance == 1 and mode_a == mode_b:
+        return 90.0  # Adjacent
+    if distance == 1:
+        return 65.0  # Adjacent different mode
+    if distance <= 2:
+        return 55.0
+    return max(20.0, 50.0 - distance * 5)
+
+
+def _energy_score(energy_a: float, energy_b: float) -> float:
+    """Energy-flow ladder (25% weight); slight increases score best."""
     energy_diff = energy_b - energy_a
-
     if 0 <= energy_diff < 0.15:
-        energy_score = 100  # Slight increase is ideal
-    elif abs(energy_diff) < 0.1:
-        energy_score = 95  # Similar energy
-    elif 0.15 <= energy_diff < 0.3:
-        energy_score = 85  # Moderate increase
-    elif -0.15 <= energy_diff < 0:
-        energy_score = 80  # Slight decrease
-    elif abs(energy_diff) < 0.3:
-        energy_score = 70
-    elif abs(energy_diff) < 0.5:
-        energy_score = 55
-    else:
-        energy_score = 40
+        return 100.0  # Slight increase is ideal
+    if abs(energy_diff) < 0.1:
+        return 95.0  # Similar energy
+    if 0.15 <= energy_diff < 0.3:
+        return 85.0  # Moderate increase
+    if -0.15 <= energy_diff < 0:
+        return 80.0  # Slight decrease
+    if abs(energy_diff) < 0.3:
+        return 70.0
+    if abs(energy_diff) < 0.5:
+        return 55.0
+    return 40.0
+
+
+def _score_breakdown(analysis_a: dict, analysis_b: dict) -> tuple:
+    """
+    Compute the (bpm, key, energy) subscores for a track pair.
+
+    Subscores stay float here — truncating before the weighted sum would
+    shift the total in the fractional BPM-fallback branch.
+    """
+    num_a, mode_a = _camelot(analysis_a)
+    num_b, mode_b = _camelot(analysis_b)
+    return (
+        _bpm_score(analysis_a["bpm"], analysis_b["bpm"]),
+        _key_score(num_a, mode_a, num_b, mode_b),
+        _energy_score(analysis_a["energy"], analysis_b["energy"]),
+    )
 
-    # Weighted average
-    total_score = int(bpm_score * 0.4 + key_score * 0.35 + energy_score * 0.25)
 
-    return total_score
+def calculate_compatibility_score(analysis_a: dict, analysis_b: dict) -> int:
+    """
+    Calculate mix compatibility score between two tracks.
+
+    Returns score 0-100 based on BPM, key, and energy compatibility.
+    """
+    bpm_score, key_score, energy_score = _score_breakdown(analysis_a, analysis_b)
+    return int(bpm_score * 0.4 + key_score * 0.35 + energy_score * 0.25)
 
 
 def calculate_mix_compatibility(analysis_a: dict, analysis_b: dict) -> dict:
@@ -530,82 +1062,7 @@ def calculate_mix_compatibility(analysis_a: dict, analysis_b: dict) -> dict:
 
     Returns dict with overall score and breakdown.
     """
-    # Calculate individual scores
-    bpm_a = analysis_a["bpm"]
-    bpm_b = analysis_b["bpm"]
-    bpm_ratio = bpm_a / bpm_b if bpm_b > 0 else 1
-    bpm_diff = abs(1 - bpm_ratio) * 100
-
-    if bpm_diff < 1:
-        bpm_score = 100
-    elif bpm_diff < 3:
-        bpm_score = 95
-    elif bpm_diff < 6:
-        bpm_score = 85
-    elif bpm_diff < 10:
-        bpm_score = 70
-    else:
-        double_diff = abs(1 - bpm_ratio * 2) * 100
-        half_diff = abs(1 - bpm_ratio / 2) * 100
-        if min(double_diff, half_diff) < 6:
-            bpm_score = 80
-        else:
-            bpm_score = max(10, 50 - int(bpm_diff))
-
-    # Key score (reuse logic from above)
-    def normalize_key(key: str) -> str:
-        key = key.strip()
-        if key.endswith("m") and " " not in key:
-            return key[:-1] + " minor"
-        if " " not in key:
-            return key + " major"
-        return key
-
-    key_a = normalize_key(analysis_a["key"])
-    key_b = normalize_key(analysis_b["key"])
-
-    camelot_a = CAMELOT_MAP.get(key_a, (8, "A"))
-    camelot_b = CAMELOT_MAP.get(key_b, (8, "A"))
-
-    num_a, mode_a = camelot_a
-    num_b, mode_b = camelot_b
-
-    if num_a == num_b and mode_a == mode_b:
-        key_score = 100
-    elif num_a == num_b:
-        key_score = 80
-    else:
-        distance = min(abs(num_a - num_b), 12 - abs(num_a - num_b))
-        if distance == 1 and mode_a == mode_b:
-            key_score = 90
-        elif distance == 1:
-            key_score = 65
-        elif distance <= 2:
-            key_score = 55
-        else:
-            key_score = max(20, 50 - distance * 5)
-
-    # Energy score
-    energy_a = analysis_a["energy"]
-    energy_b = analysis_b["energy"]
-    energy_diff = energy_b - energy_a
-
-    if 0 <= energy_diff < 0.15:
-        energy_score = 100
-    elif abs(energy_diff) < 0.1:
-        energy_score = 95
-    elif 0.15 <= energy_diff < 0.3:
-        energy_score = 85
-    elif -0.15 <= energy_diff < 0:
-        energy_score = 80
-    elif abs(energy_diff) < 0.3:
-        energy_score = 70
-    elif abs(energy_diff) < 0.5:
-        energy_score = 55
-    else:
-        energy_score = 40
-
-    # Overall score
+    bpm_score, key_score, energy_score = _score_breakdown(analysis_a, analysis_b)
     overall_score = int(bpm_score * 0.4 + key_score * 0.35 + energy_score * 0.25)
 
     # Generate recommendation
@@ -624,8 +1081,8 @@ def calculate_mix_compatibility(analysis_a: dict, analysis_b: dict) -> dict:
 
     return {
         "score": overall_score,
-        "bpmMatch": bpm_score,
-        "keyMatch": key_score,
-        "energyFlow": energy_score,
+        "bpmMatch": int(bpm_score),
+        "keyMatch": int(key_score),
+        "energyFlow": int(energy_score),
         "recommendation": recommendation,
     }
@@ -0,0 +1,123 @@
+"""Persistent Demucs worker process.
+
+Loading htdemucs weights (~300 MB) takes seconds, and spawning a fresh
+`python -m demucs.separate` per request pays that cost every time. This
+worker keeps one long-lived subprocess with the model resident and feeds
+it jobs over multiprocessing queues, so only the first separation after
+startup pays the model load.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from pathlib import Path
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Upper bound on one separation job, matching the old CLI subprocess timeout
+_JOB_TIMEOUT = 600
+
+
+def _worker_loop(job_queue, result_queue, model_name: str, device: str) -> None:
+    """Subprocess entry point: load the model once, then serve jobs forever."""
+    import torch
+    import torchaudio
+    from demucs.apply import apply_model
+    from demucs.pretrained import get_model
+
+    if device == "cuda" and not torch.cuda.is_available():
+        device = "cpu"
+
+    model = get_model(model_name)
+    model.to(device)
+    model.eval()
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        track_id, audio_path, out_dir = job
+        try:
+            waveform, sr = torchaudio.load(audio_path)
+            if sr != model.samplerate:
+                waveform = torchaudio.functional.resample(waveform, sr, model.samplerate)
+            if waveform.shape[0] == 1:
+                waveform = waveform.repeat(2, 1)
+
+            # Normalize as demucs.separate does, and undo it on the way out
+            ref = waveform.mean(0)
+            waveform = (waveform - ref.mean()) / (ref.std() + 1e-8)
+            with torch.no_grad():
+                sources = apply_model(model, waveform[None], device=device)[0]
+            sources = sources * (ref.std() + 1e-8) + ref.mean()
+
+            for name, source in zip(model.sources, sources):
+                torchaudio.save(
+                    str(Path(out_dir) / f"{name}.wav"), source.cpu(), model.samplerate
+                )
+            result_queue.put((track_id, None))
+        except Exception as e:
+            result_queue.put((track_id, str(e)))
+
+
+class StemWorker:
+    """Lazily-spawned handle to the persistent separation process."""
+
+    def __init__(self):
+        self._proc = None
+        self._jobs = None
+        self._results = None
+
+    def _ensure_started(self) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            return
+        ctx = mp.get_context("spawn")
+        self._jobs = ctx.Queue()
+        self._results = ctx.Queue()
+        self._proc = ctx.Process(
+            target=_worker_loop,
+            args=(self._jobs, self._results, settings.demucs_model, settings.demucs_device),
+            daemon=True,
+        )
+        self._proc.start()
+
+    def _shutdown(self) -> None:
+        """Drop the worker so the next job respawns a fresh process."""
+        if self._proc is not None and self._proc.is_alive():
+            self._proc.terminate()
+        self._proc = None
+
+    def separate(self, track_id: int, audio_path: Path, out_dir: Path) -> None:
+        """
+        Run one separation job, writing the stem WAVs into out_dir.
+
+        Blocking — call from a worker thread. Raises on worker-reported
+        failure, and on a dead or hung worker (Demucs can OOM mid-job)
+        after scheduling a respawn, so one bad job can't wedge the whole
+        stem pipeline. Only the single stem batch worker consumes this,
+        so the result queue needs no request/response matching.
+        """
+        self._ensure_started()
+        self._jobs.put((track_id, str(audio_path), str(out_dir)))
+        deadline = time.monotonic() + _JOB_TIMEOUT
+        while True:
+            try:
+                _, error = self._results.get(timeout=5)
+                break
+            except queue.Empty:
+                if not self._proc.is_alive():
+                    self._shutdown()
+                    raise Exception("Demucs worker died mid-job")
+                if time.monotonic() > deadline:
+                    self._shutdown()
+                    raise Exception(
+                        f"Demucs worker timed out after {_JOB_TIMEOUT}s"
+                    )
+        if error:
+            raise Exception(f"Demucs worker failed: {error}")
+
+
+# Shared worker handle for the analysis service
+stem_worker = StemWorker()
@@ -0,0 +1,107 @@
+"""Track metadata store for uploaded files.
+
+Backed by Redis hashes when REDIS_URL is configured, so uploads survive
+restarts and stay consistent across multiple Uvicorn workers (each worker
+used to keep its own in-process dict). Without Redis the store falls back
+to the old per-process dict, which is fine for the single-worker dev setup.
+"""
+
+from typing import Optional
+
+from app.config import get_settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+settings = get_settings()
+
+_NEXT_ID_KEY = "track:next_id"
+
+
+class TrackStore:
+    """Async CRUD for uploaded-track metadata."""
+
+    def __init__(self):
+        self._redis = None
+        if aioredis is not None and settings.redis_url:
+            self._redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+        # In-process fallback
+        self._tracks: dict[int, dict] = {}
+        self._next_id = 1
+
+    @staticmethod
+    def _from_hash(data: dict) -> dict:
+        """Rebuild a track dict from Redis hash fields (all strings)."""
+        return {
+            "id": int(data["id"]),
+            "title": data["title"],
+            "filename": data["filename"],
+            "duration": int(data["duration"]),
+            "file_path": data["file_path"],
+        }
+
+    async def next_id(self) -> int:
+        """Allocate the next track ID."""
+        if self._redis is not None:
+            return int(await self._redis.incr(_NEXT_ID_KEY))
+        track_id = self._next_id
+        self._next_id += 1
+        return track_id
+
+    async def put(self, track: dict) -> None:
+        """Store a track's metadata."""
+        if self._redis is not None:
+            await self._redis.hset(f"track:{track['id']}", mapping=track)
+        else:
+            self._tracks[track["id"]] = track
+
+    async def get(self, track_id: int) -> Optional[dict]:
+        """Fetch a track's metadata, or None if unknown."""
+        if self._redis is not None:
+            data = await self._redis.hgetall(f"track:{track_id}")
+            return self._from_hash(data) if data else None
+        return self._tracks.get(track_id)
+
+    async def all(self) -> list[dict]:
+        """List all tracks (SCAN + pipelined HGETALL under Redis)."""
+        if self._redis is not None:
+            keys = [
+                key
+                async for key in self._redis.scan_iter(match="track:*")
+                if key != _NEXT_ID_KEY
+            ]
+            if not keys:
+                return []
+            pipe = self._redis.pipeline()
+            for key in keys:
+                pipe.hgetall(key)
+            return [self._from_hash(data) for data in await pipe.execute() if data]
+        return list(self._tracks.values())
+
+    async def set_duration(self, track_id: int, duration_ms: int) -> None:
+        """Update a track's duration after analysis."""
+        if self._redis is not None:
+            await self._redis.hset(f"track:{track_id}", "duration", duration_ms)
+        elif track_id in self._tracks:
+            self._tracks[track_id]["duration"] = duration_ms
+
+    async def delete(self, track_id: int) -> bool:
+        """Remove a track; returns whether it existed."""
+        if self._redis is not None:
+            return bool(await self._redis.delete(f"track:{track_id}"))
+        return self._tracks.pop(track_id, None) is not None
+
+    async def clear(self) -> None:
+        """Drop all track metadata and reset ID allocation."""
+        if self._redis is not None:
+            keys = [key async for key in self._redis.scan_iter(match="track:*")]
+            if keys:
+                await self._redis.delete(*keys)
+        self._tracks.clear()
+        self._next_id = 1
+
+
+# Shared store for the upload routes
+track_store = TrackStore()
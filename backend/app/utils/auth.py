@@ -0,0 +1,31 @@
+"""Shared authorization-header and token helpers for route modules."""
+
+import hashlib
+
+from fastapi import HTTPException, Request
+
+BEARER_PREFIX = "Bearer "
+_PREFIX_LEN = len(BEARER_PREFIX)
+
+
+def token_key(token: str) -> bytes:
+    """Hash an OAuth token for use as a cache key.
+
+    blake2b is noticeably faster than sha256 on short inputs, and a 16-byte
+    digest is plenty for a local cache key; the raw bytes are hashable so
+    there's no hexdigest step either.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def extract_token(request: Request) -> str:
+    """
+    Extract the OAuth token from the Authorization header.
+
+    Slices the prefix off after a single startswith check rather than
+    scanning the header twice with startswith + replace.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith(BEARER_PREFIX):
+        raise HTTPException(status_code=401, detail="Missing authorization header")
+    return auth_header[_PREFIX_LEN:]
@@ -0,0 +1,80 @@
+"""AIMD concurrency control for upstream SoundCloud calls.
+
+Caps the number of in-flight requests to SoundCloud and adapts the cap
+additively on success and multiplicatively on failure, so the backend
+backs off automatically during upstream incidents instead of hammering a
+struggling API (and burning our own rate-limit budget on doomed calls).
+"""
+
+import asyncio
+
+import httpx
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limiter.
+
+    Successful upstream responses grow the in-flight cap by 0.5; 429/5xx
+    responses and transport errors halve it. Callers route requests
+    through `request`, which also sleeps briefly when SoundCloud's
+    advertised rate-limit budget is nearly exhausted.
+    """
+
+    def __init__(
+        self,
+        min_limit: float = 2.0,
+        max_limit: float = 64.0,
+        initial_limit: float = 16.0,
+    ):
+        self._min = min_limit
+        self._max = max_limit
+        self._limit = initial_limit
+        self._inflight = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def limit(self) -> float:
+        """Current concurrency cap (float; floor is applied on admission)."""
+        return self._limit
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs):
+        """Send a request through the controller, updating the cap from the outcome."""
+        async with self._cond:
+            while self._inflight >= int(self._limit):
+                await self._cond.wait()
+            self._inflight += 1
+
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.RequestError:
+            await self._release(success=False)
+            raise
+
+        overloaded = response.status_code == 429 or response.status_code >= 500
+        await self._release(success=not overloaded)
+
+        # Preemptive backoff when SoundCloud says we're nearly out of quota
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        limit = response.headers.get("X-RateLimit-Limit")
+        if remaining and limit:
+            try:
+                if int(remaining) < int(limit) * 0.1:
+                    await asyncio.sleep(0.1)
+            except ValueError:
+                pass
+
+        return response
+
+    async def _release(self, success: bool) -> None:
+        async with self._cond:
+            if success:
+                self._limit = min(self._max, self._limit + 0.5)
+            else:
+                self._limit = max(self._min, self._limit * 0.5)
+            self._inflight -= 1
+            self._cond.notify_all()
+
+
+# Shared controller for all api.soundcloud.com traffic
+sc_guard = AIMDController()
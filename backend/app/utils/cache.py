@@ -0,0 +1,65 @@
+"""Stale-while-revalidate cache for SoundCloud-backed responses.
+
+A plain TTL cache turns every SoundCloud hiccup into a 502 the moment an
+entry expires. Keeping entries alive past their freshness window lets
+handlers serve a slightly-stale response immediately while a background
+task refreshes it — during upstream outages the stale copy keeps being
+served (marked via an ``X-Cache: stale`` header) until the hard TTL.
+"""
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SWRCache:
+    """
+    TTL cache with a separate freshness window and hard expiry.
+
+    Entries are considered fresh for `ttl` seconds but survive (and may be
+    served stale) for `hard_ttl` seconds. `refresh` deduplicates background
+    refreshes per key so a burst of stale hits triggers one upstream call.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, hard_ttl: float = 600):
+        self._store: TTLCache = TTLCache(maxsize=maxsize, ttl=hard_ttl)
+        self._ttl = ttl
+        self._refreshing: set = set()
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        """Return (value, stale). value is None on a miss."""
+        entry = self._store.get(key)
+        if entry is None:
+            return None, False
+        value, fresh_until = entry
+        return value, monotonic() >= fresh_until
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, marking it fresh for the next `ttl` seconds."""
+        self._store[key] = (value, monotonic() + self._ttl)
+
+    def refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Kick off a background refresh for a stale key.
+
+        No-ops if a refresh for this key is already in flight. A failed
+        refresh is logged and the stale value stays alive up to hard_ttl.
+        """
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def _run():
+            try:
+                self.put(key, await fetch())
+            except Exception as e:  # refresh is best-effort; keep stale value
+                logger.warning("Background cache refresh failed: %s", e)
+            finally:
+                self._refreshing.discard(key)
+
+        asyncio.create_task(_run())
@@ -0,0 +1,26 @@
+"""Shared HTTP response helpers for route modules."""
+
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException
+
+
+def ensure_ok(
+    response: httpx.Response,
+    error_detail: str = "SoundCloud request failed",
+    not_found_detail: Optional[str] = None,
+) -> None:
+    """
+    Raise an HTTPException mirroring an upstream error response.
+
+    One monomorphic helper instead of the same three if/raise blocks pasted
+    into every handler. 401 always maps to the token error; 404 maps to
+    `not_found_detail` when the caller provides one.
+    """
+    if response.status_code == 401:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if response.status_code == 404 and not_found_detail is not None:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    if response.status_code >= 400:
+        raise HTTPException(status_code=response.status_code, detail=error_detail)
@@ -4,6 +4,9 @@ import pytest
 from app.services.analysis import (
     calculate_compatibility_score,
     calculate_mix_compatibility,
+    compat_features,
+    pairwise_compat,
+    score_one_to_many,
     CAMELOT_MAP,
     KEY_SHORT_NAMES,
 )
@@ -129,6 +132,62 @@ class TestCompatibilityScore:
         assert score >= 90, f"Energy increase should score >=90, got {score}"
 
 
+class TestPairwiseCompat:
+    """Tests for the vectorized pairwise score matrix."""
+
+    def test_matches_scalar_scorer(self):
+        """Matrix entries should equal pairwise calculate_compatibility_score."""
+        analyses = [
+            create_mock_analysis(bpm=128, key="Am", energy=0.7),
+            create_mock_analysis(bpm=130, key="Dm", energy=0.6),
+            create_mock_analysis(bpm=90, key="C", energy=0.3),
+            create_mock_analysis(bpm=64, key="F#m", energy=0.9),
+        ]
+        matrix = pairwise_compat(compat_features(analyses))
+
+        for i, a in enumerate(analyses):
+            for j, b in enumerate(analyses):
+                expected = calculate_compatibility_score(a, b)
+                assert matrix[i, j] == expected, (
+                    f"Matrix [{i},{j}] = {matrix[i, j]}, scalar = {expected}"
+                )
+
+    def test_matrix_shape(self):
+        """Matrix should be N x N."""
+        analyses = [create_mock_analysis() for _ in range(5)]
+        matrix = pairwise_compat(compat_features(analyses))
+        assert matrix.shape == (5, 5)
+
+    def test_large_playlist_matches_scalar_scorer(self):
+        """The large-N path (Numba when available) should match the scalar scorer."""
+        keys = ["Am", "Dm", "C", "F#m", "G", "Bbm", "E"]
+        analyses = [
+            create_mock_analysis(
+                bpm=80 + 3 * i, key=keys[i % len(keys)], energy=(i % 10) / 10
+            )
+            for i in range(25)
+        ]
+        matrix = pairwise_compat(compat_features(analyses))
+
+        for i, a in enumerate(analyses):
+            for j, b in enumerate(analyses):
+                assert matrix[i, j] == calculate_compatibility_score(a, b)
+
+    def test_one_to_many_matches_matrix_row(self):
+        """score_one_to_many should reproduce one row of the pairwise matrix."""
+        analyses = [
+            create_mock_analysis(bpm=128, key="Am", energy=0.7),
+            create_mock_analysis(bpm=130, key="Dm", energy=0.6),
+            create_mock_analysis(bpm=90, key="C", energy=0.3),
+        ]
+        feats = compat_features(analyses)
+        matrix = pairwise_compat(feats)
+
+        for i in range(len(analyses)):
+            row = score_one_to_many(feats[i], feats)
+            assert row.tolist() == matrix[i].tolist()
+
+
 class TestMixCompatibility:
     """Tests for detailed mix compatibility calculation."""
 
@@ -0,0 +1,71 @@
+"""Route-level tests for file streaming and response caching behavior."""
+
+import shutil
+
+import orjson
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.main import app
+
+settings = get_settings()
+
+TRACK_ID = 999999
+CACHED_TRACK_ID = 999998
+
+
+class TestRangeRequests:
+    """Byte-range support on stem serving (audio player seeks)."""
+
+    def setup_method(self):
+        stem_dir = settings.stems_dir / str(TRACK_ID)
+        stem_dir.mkdir(parents=True, exist_ok=True)
+        (stem_dir / "drums.wav").write_bytes(bytes(range(256)))
+
+    def teardown_method(self):
+        shutil.rmtree(settings.stems_dir / str(TRACK_ID), ignore_errors=True)
+
+    def test_range_request_returns_partial_content(self):
+        with TestClient(app) as client:
+            resp = client.get(
+                f"/api/uploads/tracks/{TRACK_ID}/stems/drums",
+                headers={"Range": "bytes=10-19"},
+            )
+
+        assert resp.status_code == 206
+        assert resp.content == bytes(range(10, 20))
+        assert resp.headers["content-range"] == "bytes 10-19/256"
+        assert resp.headers["content-length"] == "10"
+
+    def test_full_request_advertises_range_support(self):
+        with TestClient(app) as client:
+            resp = client.get(f"/api/uploads/tracks/{TRACK_ID}/stems/drums")
+
+        assert resp.status_code == 200
+        assert resp.headers["accept-ranges"] == "bytes"
+        assert len(resp.content) == 256
+
+
+class TestResponseCache:
+    """Whole-response caching on the analysis endpoints."""
+
+    def setup_method(self):
+        settings.analysis_dir.mkdir(parents=True, exist_ok=True)
+        self._cache_path = settings.analysis_dir / f"{CACHED_TRACK_ID}.json"
+        self._cache_path.write_bytes(
+            orjson.dumps({"trackId": CACHED_TRACK_ID, "bpm": 128.0, "key": "Am"})
+        )
+
+    def teardown_method(self):
+        self._cache_path.unlink(missing_ok=True)
+
+    def test_cache_hit_keeps_content_type(self):
+        with TestClient(app) as client:
+            first = client.get(f"/api/tracks/{CACHED_TRACK_ID}/analysis")
+            second = client.get(f"/api/tracks/{CACHED_TRACK_ID}/analysis")
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert second.headers.get("x-cache") == "hit"
+        assert second.headers["content-type"] == first.headers["content-type"]
+        assert second.json() == first.json()